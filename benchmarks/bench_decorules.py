@@ -0,0 +1,209 @@
+"""
+Micro benchmarks of decorules, comparing decorated classes against plain ones.
+
+Run from the root of the repository (no extra packages are required):
+
+    python benchmarks/bench_decorules.py --output bench.json
+    python benchmarks/bench_decorules.py --output bench_new.json --compare bench.json
+    python benchmarks/bench_decorules.py --disable-instance-checks --compare bench.json
+
+Every benchmark reports the best time per call (in seconds) over a number of repeats. The results are written
+as JSON so that runs of different versions can be compared with --compare.
+"""
+import argparse
+import json
+import operator
+import os
+import platform
+import sys
+import tempfile
+import time
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'src'), os.path.join(ROOT, 'src', 'example')]
+
+from decorules.has_rules_actions import HasRulesActions, EnforcedFunctions
+from decorules.decorators import raise_if_false_on_class, raise_if_false_on_instance
+from decorules.utils import member_enforcer
+from decorules.cache import ClassCheckCache
+from library_class import LibraryClass
+from client_class import (ClientClass, LargeNumberProcessor, LayerClass1, LayerClass2, LayerClass3, LayerClass4,
+                          MultipleInheritanceClass)
+
+RULE_COUNTS = (1, 2, 5, 10, 20, 50, 100)
+
+
+class PlainClass:
+    def __init__(self, value=1):
+        self.value = value
+
+
+class EmptyRulesClass(metaclass=HasRulesActions):
+    def __init__(self, value=1):
+        self.value = value
+
+
+class PlainLibraryClass:
+    MULTIPLIER = 0.5
+
+    def __init__(self, name: str, *args):
+        self.name = name
+        self.coordinates = list(args)
+
+
+def make_instance_rules_class(rule_count: int):
+    class InstanceRulesClass(metaclass=HasRulesActions):
+        def __init__(self, value=1):
+            self.value = value
+
+    for _ in range(rule_count):
+        InstanceRulesClass = raise_if_false_on_instance(lambda x: x.value < 10, ValueError)(InstanceRulesClass)
+    return InstanceRulesClass
+
+
+def make_disabled_instance_rules_class(rule_count: int):
+    rules_class = make_instance_rules_class(rule_count)
+    EnforcedFunctions.disable(rules_class)
+    return rules_class
+
+
+def define_class_rules_class(rule_count: int):
+    class ClassRulesClass(metaclass=HasRulesActions):
+        MULTIPLIER = 1.5
+
+    for _ in range(rule_count):
+        ClassRulesClass = raise_if_false_on_class(member_enforcer('MULTIPLIER', float, 0.0, operator.gt),
+                                                  AttributeError)(ClassRulesClass)
+    return ClassRulesClass
+
+
+def has_disjoint_ranges(cls, attrs: dict = None):
+    # stands in for a check worth caching, costing more than a look at each of the values of the class
+    return all(high <= other_low or other_high <= low
+               for index, (low, high) in enumerate(cls.RANGES) for other_low, other_high in cls.RANGES[index + 1:])
+
+
+def define_expensive_class_rules_class(rule_count: int):
+    class ExpensiveClassRulesClass(metaclass=HasRulesActions):
+        RANGES = tuple((start, start + 1) for start in range(0, 600, 2))
+
+    for _ in range(rule_count):
+        ExpensiveClassRulesClass = raise_if_false_on_class(has_disjoint_ranges,
+                                                           AttributeError)(ExpensiveClassRulesClass)
+    return ExpensiveClassRulesClass
+
+
+def with_class_check_cache(define, cache: ClassCheckCache):
+    def defined_with_cache():
+        EnforcedFunctions.use_class_check_cache(cache)
+        try:
+            return define()
+        finally:
+            EnforcedFunctions.use_class_check_cache(None)
+
+    return defined_with_cache
+
+
+def benchmarks():
+    """
+    Yields (name, function, setup, number): the function is timed `number` times after calling setup (if any),
+    which returns the argument of the function
+    """
+    yield 'construct/plain', PlainClass, None, 100_000
+    yield 'construct/has_rules_actions_no_rules', EmptyRulesClass, None, 100_000
+    yield 'construct/plain_library', lambda: PlainLibraryClass('a', 0.1, 0.2), None, 100_000
+    yield 'construct/library_class', lambda: LibraryClass('a', 0.1, 0.2), None, 20_000
+    yield 'construct/client_class', lambda: ClientClass('a', 0.1, 0.1, 0.05), None, 20_000
+    for depth, layer_class in enumerate((ClientClass, LayerClass1, LayerClass2, LayerClass3, LayerClass4)):
+        yield f'construct/layer_depth_{depth}', lambda c=layer_class: c('a', 0.1, 0.1, 0.05), None, 20_000
+    yield ('construct/multiple_inheritance', lambda: MultipleInheritanceClass('a', 0.1, 0.1, 0.05), None,
+           20_000)
+    for rule_count in RULE_COUNTS:
+        rules_class = make_instance_rules_class(rule_count)
+        yield f'construct/instance_rules_{rule_count}', rules_class, None, max(100_000 // rule_count, 1_000)
+    yield 'construct/instance_rules_10_disabled', make_disabled_instance_rules_class(10), None, 100_000
+
+    yield ('method/plain_list_append', lambda x: x.coordinates.append(0.06),
+           lambda: PlainLibraryClass('a', 0.1, 0.1, 0.05), 1_000)
+    yield ('method/client_class_append', lambda x: x.append(0.06),
+           lambda: ClientClass('a', 0.1, 0.1, 0.05), 1_000)
+    yield ('method/multiple_inheritance_multiply_multiplier', lambda x: x.multiply_multiplier(1.0),
+           lambda: MultipleInheritanceClass('a', 0.1, 0.1, 0.05), 10_000)
+    yield 'method/large_number_processor_append_number', lambda x: x.append_number(10), LargeNumberProcessor, 1_000
+
+    for rule_count in RULE_COUNTS:
+        yield (f'define/class_rules_{rule_count}', lambda n=rule_count: define_class_rules_class(n), None,
+               max(2_000 // rule_count, 20))
+    cache = ClassCheckCache(os.path.join(tempfile.mkdtemp(), 'checks.sqlite'))
+    yield ('define/class_rules_10_cached', with_class_check_cache(lambda: define_class_rules_class(10), cache), None,
+           200)
+    yield 'define/expensive_class_rules_3', lambda: define_expensive_class_rules_class(3), None, 50
+    yield ('define/expensive_class_rules_3_cached',
+           with_class_check_cache(lambda: define_expensive_class_rules_class(3), cache), None, 50)
+
+
+def measure(func, setup, number: int, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        if setup is None:
+            elapsed = timeit.timeit(func, number=number)
+        else:
+            argument = setup()
+            elapsed = timeit.timeit(lambda: func(argument), number=number)
+        best = min(best, elapsed)
+    return best / number
+
+
+def run(repeat: int, scale: float, selection: str = None) -> dict:
+    results = {}
+    for name, func, setup, number in benchmarks():
+        if selection and selection not in name:
+            continue
+        number = max(int(number * scale), 1)
+        results[name] = {'seconds_per_call': measure(func, setup, number, repeat), 'calls': number}
+        print(f"{name:55s} {results[name]['seconds_per_call'] * 1e6:10.3f} us")
+    return results
+
+
+def compare(results: dict, baseline: dict):
+    print(f"\n{'benchmark':55s} {'baseline us':>12s} {'current us':>12s} {'ratio':>8s}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['seconds_per_call']
+        after = result['seconds_per_call']
+        print(f"{name:55s} {before * 1e6:12.3f} {after * 1e6:12.3f} {after / before:8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='file to write the JSON results to')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--repeat', type=int, default=5, help='number of repeats, the best one is kept')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier on the number of calls per repeat')
+    parser.add_argument('--select', help='only run benchmarks whose name contains this string')
+    parser.add_argument('--disable-instance-checks', action='store_true',
+                        help='run with all instance checks disabled (EnforcedFunctions.disable())')
+    arguments = parser.parse_args()
+
+    if arguments.disable_instance_checks:
+        EnforcedFunctions.disable()
+
+    results = run(arguments.repeat, arguments.scale, arguments.select)
+    if arguments.output:
+        with open(arguments.output, 'w') as output:
+            json.dump({'meta': {'python': sys.version,
+                                'instance_checks_disabled': arguments.disable_instance_checks,
+                                'implementation': platform.python_implementation(),
+                                'platform': platform.platform(),
+                                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z')},
+                       'results': results},
+                      output, indent=2)
+    if arguments.compare:
+        with open(arguments.compare) as baseline:
+            compare(results, json.load(baseline)['results'])
+
+
+if __name__ == '__main__':
+    main()
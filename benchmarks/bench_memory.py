@@ -0,0 +1,108 @@
+"""
+Memory benchmark of decorules: the memory taken by many instances of decorated classes compared to plain ones, with
+and without __slots__. decorules should add nothing per instance.
+
+Run from the root of the repository (no extra packages are required):
+
+    python benchmarks/bench_memory.py
+    python benchmarks/bench_memory.py --count 100000 --output memory.json
+"""
+import argparse
+import gc
+import json
+import operator
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'src')]
+
+from decorules.has_rules_actions import HasRulesActions
+from decorules.decorators import raise_if_false_on_instance, run_changed_instance_rules
+from decorules.utils import member_enforcer
+
+
+class PlainRecord:
+    def __init__(self, price=1.0, quantity=1):
+        self.price = price
+        self.quantity = quantity
+
+
+class PlainSlottedRecord:
+    __slots__ = ('price', 'quantity')
+
+    def __init__(self, price=1.0, quantity=1):
+        self.price = price
+        self.quantity = quantity
+
+
+@raise_if_false_on_instance(member_enforcer('quantity', int, 0, operator.gt), ValueError)
+@raise_if_false_on_instance(member_enforcer('price', float, 0.0, operator.gt), ValueError)
+class DecoratedRecord(metaclass=HasRulesActions):
+    def __init__(self, price=1.0, quantity=1):
+        self.price = price
+        self.quantity = quantity
+
+    @run_changed_instance_rules
+    def set_price(self, price):
+        self.price = price
+
+
+@raise_if_false_on_instance(member_enforcer('quantity', int, 0, operator.gt), ValueError)
+@raise_if_false_on_instance(member_enforcer('price', float, 0.0, operator.gt), ValueError)
+class DecoratedSlottedRecord(metaclass=HasRulesActions):
+    __slots__ = ('price', 'quantity')
+
+    def __init__(self, price=1.0, quantity=1):
+        self.price = price
+        self.quantity = quantity
+
+    @run_changed_instance_rules
+    def set_price(self, price):
+        self.price = price
+
+
+RECORD_CLASSES = (PlainRecord, DecoratedRecord, PlainSlottedRecord, DecoratedSlottedRecord)
+
+
+def measure(record_class, count: int) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    records = [record_class(1.5, 2) for _ in range(count)]
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # the list holding the records is not part of their cost
+    per_instance = (current - sys.getsizeof(records)) / count
+    del records
+    return {'bytes_per_instance': per_instance, 'peak_bytes': peak, 'seconds': elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=1_000_000, help='number of instances per class')
+    parser.add_argument('--output', help='file to write the JSON results to')
+    arguments = parser.parse_args()
+
+    results = {}
+    for record_class in RECORD_CLASSES:
+        results[record_class.__name__] = measure(record_class, arguments.count)
+        print(f"{record_class.__name__:25s} {results[record_class.__name__]['bytes_per_instance']:8.1f} bytes "
+              f"{results[record_class.__name__]['seconds']:8.3f} s")
+    if arguments.output:
+        with open(arguments.output, 'w') as output:
+            json.dump({'meta': {'python': sys.version,
+                                'implementation': platform.python_implementation(),
+                                'platform': platform.platform(),
+                                'count': arguments.count,
+                                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z')},
+                       'results': results},
+                      output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+import math
+import operator
+from collections import Counter
+from collections.abc import Iterable
+from functools import partial
+
+# rules on collections (e.g. "the mean of the list stays below 30") normally go over the whole collection after every
+# guarded call. a TrackedList keeps its aggregates up to date on every mutation instead, so that the predicates below
+# are O(1) (O(number of types) for type counts) rather than O(n).
+
+# every finite float is a whole multiple of 2 ** -1074, scaled by 2 ** 1074 floats are summed exactly as ints
+_SCALE_BITS = 1074
+
+
+def _scaled(value: float) -> int:
+    numerator, denominator = value.as_integer_ratio()
+    return numerator << (_SCALE_BITS - denominator.bit_length() + 1)
+
+
+def _is_exact(value) -> bool:
+    # the values summed without any rounding: ints and finite floats
+    return isinstance(value, int) or (isinstance(value, float) and math.isfinite(value))
+
+
+class TrackedList(list):
+    """
+    A list keeping a running size, sum, minimum, maximum and a Counter of the types of its elements. The numeric
+    aggregates require numeric (hashable, orderable) elements: once a non-numeric element is added they raise a
+    TypeError. The sum of ints and floats is kept exactly, so it does not drift however many elements are added and
+    removed and it equals math.fsum over the elements. The minimum and maximum are recomputed over the distinct
+    values only when the last copy of the current extreme is removed.
+    """
+
+    def __init__(self, iterable=()):
+        super().__init__()
+        self._reset_sums()
+        self._values = Counter()
+        self._types = Counter()
+        self._numeric = True
+        self._min = None
+        self._max = None
+        self.extend(iterable)
+
+    def __reduce__(self):
+        return type(self), (list(self),)
+
+    def _reset_sums(self):
+        self._int_sum = 0
+        # the floats scaled by 2 ** _SCALE_BITS
+        self._float_sum = 0
+        self._floats = 0
+        # anything else, e.g. Decimal values or infinities, summed as usual
+        self._other_sum = 0
+        self._others = 0
+
+    def _add_to_sum(self, value, sign: int):
+        if isinstance(value, int):
+            self._int_sum += sign * value
+        elif _is_exact(value):
+            self._float_sum += sign * _scaled(value)
+            self._floats += sign
+        else:
+            self._others += sign
+            if self._others == 0:
+                # e.g. inf - inf would leave nan behind
+                self._other_sum = 0
+            elif sign > 0:
+                self._other_sum += value
+            elif isinstance(value, float):
+                # an infinity or nan, the sum of the ones left is taken again
+                self._other_sum = 0
+                for other, copies in self._values.items():
+                    if not _is_exact(other):
+                        for _ in range(copies):
+                            self._other_sum += other
+            else:
+                self._other_sum -= value
+
+    def _added(self, value):
+        self._types[type(value)] += 1
+        if not self._numeric:
+            return
+        try:
+            self._add_to_sum(value, 1)
+            self._values[value] += 1
+            if self._min is None or value < self._min:
+                self._min = value
+            if self._max is None or value > self._max:
+                self._max = value
+        except TypeError:
+            self._numeric = False
+
+    def _removed(self, value):
+        self._types[type(value)] -= 1
+        if self._types[type(value)] <= 0:
+            del self._types[type(value)]
+        if not self._numeric:
+            return
+        self._values[value] -= 1
+        self._add_to_sum(value, -1)
+        if self._values[value] <= 0:
+            del self._values[value]
+            if value == self._min:
+                self._min = min(self._values) if self._values else None
+            if value == self._max:
+                self._max = max(self._values) if self._values else None
+
+    def _numeric_aggregate(self, value):
+        if not self._numeric:
+            raise TypeError("TrackedList holds non-numeric elements")
+        return value
+
+    # not count, which would hide list.count
+    @property
+    def size(self) -> int:
+        return len(self)
+
+    @property
+    def sum(self):
+        total = self._int_sum
+        if self._floats:
+            # true division of ints is correctly rounded
+            total = ((total << _SCALE_BITS) + self._float_sum) / (1 << _SCALE_BITS)
+        if self._others:
+            total = total + self._other_sum
+        return self._numeric_aggregate(total)
+
+    @property
+    def mean(self):
+        return self.sum / len(self) if self else None
+
+    @property
+    def min(self):
+        return self._numeric_aggregate(self._min)
+
+    @property
+    def max(self):
+        return self._numeric_aggregate(self._max)
+
+    @property
+    def type_counter(self) -> Counter:
+        return self._types
+
+    def append(self, value):
+        super().append(value)
+        self._added(value)
+
+    def extend(self, iterable):
+        values = list(iterable)
+        super().extend(values)
+        for value in values:
+            self._added(value)
+
+    def insert(self, index, value):
+        super().insert(index, value)
+        self._added(value)
+
+    def pop(self, index=-1):
+        value = super().pop(index)
+        self._removed(value)
+        return value
+
+    def remove(self, value):
+        position = self.index(value)
+        self._removed(self[position])
+        super().__delitem__(position)
+
+    def clear(self):
+        super().clear()
+        self._reset_sums()
+        self._values.clear()
+        self._types.clear()
+        self._numeric = True
+        self._min = None
+        self._max = None
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            removed = self[index]
+            value = list(value)
+        else:
+            removed = [self[index]]
+        super().__setitem__(index, value)
+        for old_value in removed:
+            self._removed(old_value)
+        for new_value in (value if isinstance(index, slice) else [value]):
+            self._added(new_value)
+
+    def __delitem__(self, index):
+        removed = self[index] if isinstance(index, slice) else [self[index]]
+        super().__delitem__(index)
+        for old_value in removed:
+            self._removed(old_value)
+
+    def __iadd__(self, iterable):
+        self.extend(iterable)
+        return self
+
+    def __imul__(self, times):
+        values = list(self)
+        if times <= 0:
+            self.clear()
+        else:
+            self.extend(values * (times - 1))
+        return self
+
+
+def _sum(values):
+    # the same sum as TrackedList.sum, exact for ints and floats
+    if any(isinstance(value, float) for value in values):
+        try:
+            return math.fsum(values)
+        except (TypeError, ValueError, OverflowError):
+            # e.g. Decimal values, or inf and -inf together
+            pass
+    return sum(values)
+
+
+_AGGREGATES = {
+    'count': len,
+    'sum': _sum,
+    'mean': lambda values: _sum(values) / len(values),
+    'min': min,
+    'max': max,
+}
+# the aggregates an empty collection has no value for, see when_empty
+_UNDEFINED_WHEN_EMPTY = frozenset(('mean', 'min', 'max'))
+
+
+def _aggregate_comparison_enforcer(instance_or_type,
+                                   list_name: str,
+                                   aggregate: str,
+                                   comparison_value,
+                                   operator_used=operator.lt,
+                                   when_empty: bool = True,
+                                   attrs: dict = None):
+    member_object = getattr(instance_or_type, list_name, None)
+    if member_object is None and attrs is not None:
+        member_object = attrs.get(list_name, None)
+    if member_object is None or not isinstance(member_object, Iterable):
+        return False
+    if isinstance(member_object, TrackedList):
+        if not member_object and aggregate in _UNDEFINED_WHEN_EMPTY:
+            return when_empty
+        tracked = len(member_object) if aggregate == 'count' else getattr(member_object, aggregate)
+        return operator_used(tracked, comparison_value)
+    # any other collection needs to be gone through completely
+    values = list(member_object)
+    if not values and aggregate in _UNDEFINED_WHEN_EMPTY:
+        return when_empty
+    return operator_used(_AGGREGATES[aggregate](values), comparison_value)
+
+
+def aggregate_enforcer(list_name: str,
+                       aggregate: str,
+                       comparison_value,
+                       operator_used=operator.lt,
+                       when_empty: bool = True):
+    """
+    Creates a predicate comparing an aggregate of a collection attribute to a value, e.g.
+    aggregate_enforcer('to_process_list', 'mean', 30.0) checks that the mean of to_process_list is < 30.0.
+    This is O(1) when the attribute is a TrackedList and falls back on going through the collection otherwise.
+
+    :param list_name: name of the collection attribute
+    :param aggregate: one of 'count', 'sum', 'mean', 'min' and 'max'
+    :param comparison_value: the value the aggregate is compared to
+    :param operator_used: the comparison, defaults to operator.lt
+    :param when_empty: the outcome for an empty collection, which has no mean, min or max (its count and sum are 0)
+    :return: the predicate, declaring it reads list_name (see run_changed_instance_rules)
+    """
+    if aggregate not in _AGGREGATES:
+        raise ValueError(f"aggregate must be one of {list(_AGGREGATES)}, not {aggregate}")
+    predicate = partial(_aggregate_comparison_enforcer,
+                        list_name=list_name,
+                        aggregate=aggregate,
+                        comparison_value=comparison_value,
+                        operator_used=operator_used,
+                        when_empty=when_empty)
+    predicate.reads = (list_name,)
+    return predicate
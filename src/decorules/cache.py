@@ -0,0 +1,385 @@
+import dataclasses
+import enum
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import types
+import weakref
+from functools import partial
+from decorules.fields import FieldRule, _MISSING
+from decorules.utils import rule_identity, member_enforcer_arguments
+
+# an on-disk record of the class checks that passed, so that short lived processes importing unchanged classes do not
+# run them again (see EnforcedFunctions.use_class_check_cache). only passes are stored: a failing check always runs and
+# raises as usual. an entry is keyed by the class, a fingerprint of the class and a fingerprint of the rule, any change
+# to either gives a different key, so stale entries are never used (they are just left behind, see clear). a class or
+# rule holding a value without a stable representation is never cached, its checks simply run.
+
+_SIMPLE_TYPES = (int, float, complex, str, bytes, bool, type(None))
+# the repr of a sequence of exactly these types is exact, e.g. a large table of numbers is shown in one go
+_REPR_TYPES = frozenset(_SIMPLE_TYPES)
+# values that can change without being rebound, they are fingerprinted again on every check
+_MUTABLE_TYPES = (list, dict, set, bytearray)
+# deep enough for any sensible class attribute, and a guard against self referencing values
+_MAX_DEPTH = 20
+
+
+def default_cache_path() -> str:
+    cache_directory = os.environ.get('DECORULES_CACHE_DIR') or os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'decorules')
+    return os.path.join(cache_directory, 'class_checks.sqlite')
+
+
+class ClassCheckCache:
+    """
+    SQLite file holding the class checks that passed. The fingerprint of a class covers the contents of the source
+    files of the classes in its method resolution order, their qualified names and the values of their attributes:
+    numbers, strings and the like, containers of these, classes, enum members and functions (their source file,
+    default arguments and closures), so attributes computed on import from e.g. environment variables are covered.
+    The fingerprint of a rule covers its identity (see utils.rule_identity), the source file of its predicate and the
+    bound arguments, closures and module level values it refers to, with the source files of the modules it refers
+    to and the values of the attributes it reads from them (e.g. settings.MAX_RATE). A class or rule holding any
+    other value (or without a source file, e.g. created with exec) is never cached. Neither are member_enforcer checks, which cost
+    less than looking them up. Any error of the database turns the cache off, the checks then simply run.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or default_cache_path()
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._broken = False
+        self._lock = threading.Lock()
+        # the source files do not change under the code loaded from them, each is hashed once
+        self._file_hashes = {}
+        # class -> (state of its attributes, fingerprint), see _class_fingerprint
+        self._class_fingerprints = weakref.WeakKeyDictionary()
+        # check -> (the mutable module level values its predicate refers to, their fingerprints, rule fingerprint)
+        self._rule_fingerprints = weakref.WeakKeyDictionary()
+        # collects the mutable module level values while a rule fingerprint is taken
+        self._mutable_globals = None
+        # (class name, class fingerprint) -> rule fingerprints of the checks that passed, read once from the file
+        self._passed = {}
+
+    def _connect(self):
+        if self._broken:
+            return None
+        if self._connection is None:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._connection = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+                self._connection.execute("CREATE TABLE IF NOT EXISTS passed_class_checks ("
+                                         "class_name TEXT, class_fingerprint TEXT, rule_fingerprint TEXT, "
+                                         "PRIMARY KEY (class_name, class_fingerprint, rule_fingerprint))")
+                self._connection.commit()
+            except (sqlite3.Error, OSError):
+                self._broken = True
+                self._connection = None
+        return self._connection
+
+    def _file_hash(self, filename: str):
+        file_hash = self._file_hashes.get(filename)
+        if file_hash is None:
+            try:
+                with open(filename, 'rb') as source:
+                    file_hash = hashlib.sha256(source.read()).hexdigest()
+            except (OSError, TypeError):
+                file_hash = ''
+            self._file_hashes[filename] = file_hash
+        return file_hash or None
+
+    def _code_fingerprint(self, code: types.CodeType, function_globals: dict, depth: int):
+        file_hash = self._file_hash(code.co_filename)
+        if file_hash is None:
+            return None
+        parts = [f"{code.co_qualname if hasattr(code, 'co_qualname') else code.co_name}@{file_hash}"]
+        if function_globals is not None:
+            # the module level values the code refers to (attribute names that happen to match a global too)
+            for name in sorted(set(code.co_names)):
+                if name in function_globals:
+                    value = function_globals[name]
+                    if isinstance(value, _MUTABLE_TYPES) and self._mutable_globals is not None:
+                        self._mutable_globals.append(value)
+                    shown = (self._module_fingerprint(value, code.co_names, depth + 1)
+                             if isinstance(value, types.ModuleType) else
+                             self._value_fingerprint(value, depth + 1, True))
+                    if shown is None:
+                        return None
+                    parts.append(f"{name}={shown}")
+            for constant in code.co_consts:
+                if isinstance(constant, types.CodeType):
+                    shown = self._code_fingerprint(constant, function_globals, depth + 1)
+                    if shown is None:
+                        return None
+                    parts.append(shown)
+        return f"code({';'.join(parts)})"
+
+    def _module_fingerprint(self, module: types.ModuleType, names, depth: int):
+        # the source of the module and the values of the attributes the code may read from it, e.g. settings.MAX_RATE
+        if depth > _MAX_DEPTH:
+            return None
+        if getattr(module, '__file__', None) is not None:
+            file_hash = self._file_hash(module.__file__)
+        elif module.__name__ in sys.builtin_module_names:
+            file_hash = 'builtin'
+        else:
+            # e.g. made with types.ModuleType, nothing tells whether it changed
+            return None
+        if file_hash is None:
+            return None
+        parts = [f"module {module.__name__}@{file_hash}"]
+        module_attributes = vars(module)
+        for name in sorted(set(names)):
+            if name not in module_attributes:
+                continue
+            value = module_attributes[name]
+            if isinstance(value, _MUTABLE_TYPES) and self._mutable_globals is not None:
+                self._mutable_globals.append(value)
+            # the code of functions read from the module is covered by the source files
+            shown = (self._module_fingerprint(value, names, depth + 1) if isinstance(value, types.ModuleType) else
+                     self._value_fingerprint(value, depth + 1))
+            if shown is None:
+                return None
+            parts.append(f"{name}={shown}")
+        return ';'.join(parts)
+
+    def _function_fingerprint(self, func: types.FunctionType, depth: int, with_globals: bool):
+        code = self._code_fingerprint(func.__code__, func.__globals__ if with_globals else None, depth)
+        if code is None:
+            return None
+        cells = []
+        for cell in func.__closure__ or ():
+            try:
+                contents = cell.cell_contents
+            except ValueError:
+                cells.append('empty')
+                continue
+            if isinstance(contents, type) and func.__qualname__.startswith(contents.__qualname__ + '.'):
+                # the __class__ cell of a method using super()
+                cells.append(f"class {contents.__qualname__}")
+                continue
+            cells.append(self._value_fingerprint(contents, depth + 1, with_globals))
+        parts = (code,
+                 self._value_fingerprint(func.__defaults__, depth + 1, with_globals),
+                 self._value_fingerprint(func.__kwdefaults__, depth + 1, with_globals),
+                 *cells)
+        if any(part is None for part in parts):
+            return None
+        return f"function({','.join(parts)})"
+
+    def _value_fingerprint(self, value, depth: int = 0, with_globals=False):
+        """
+        A representation of value that is the same in every process for the same value, or None if there is none
+        """
+        if depth > _MAX_DEPTH:
+            return None
+        value_type = type(value)
+        if isinstance(value, enum.Enum):
+            return f"{value_type.__module__}.{value_type.__qualname__}.{value.name}"
+        if isinstance(value, _SIMPLE_TYPES):
+            return f"{value_type.__qualname__}:{value!r}"
+        if isinstance(value, (tuple, list)):
+            if set(map(type, value)) <= _REPR_TYPES:
+                return f"{value_type.__qualname__}{list(value)!r}"
+            items = [self._value_fingerprint(item, depth + 1, with_globals) for item in value]
+            return None if None in items else f"{value_type.__qualname__}({','.join(items)})"
+        if isinstance(value, (set, frozenset)):
+            items = [self._value_fingerprint(item, depth + 1, with_globals) for item in value]
+            return None if None in items else f"{value_type.__qualname__}({','.join(sorted(items))})"
+        if isinstance(value, dict):
+            items = [(self._value_fingerprint(key, depth + 1, with_globals),
+                      self._value_fingerprint(item, depth + 1, with_globals)) for key, item in value.items()]
+            if any(key is None or item is None for key, item in items):
+                return None
+            return f"{value_type.__qualname__}({','.join(sorted(f'{key}:{item}' for key, item in items))})"
+        if isinstance(value, type):
+            return f"class {value.__module__}.{value.__qualname__}"
+        if isinstance(value, types.FunctionType):
+            return self._function_fingerprint(value, depth + 1, with_globals)
+        if isinstance(value, types.BuiltinFunctionType):
+            return f"builtin {getattr(value, '__module__', None)}.{value.__qualname__}"
+        if isinstance(value, partial):
+            parts = (self._value_fingerprint(value.func, depth + 1, with_globals),
+                     self._value_fingerprint(value.args, depth + 1, with_globals),
+                     self._value_fingerprint(value.keywords, depth + 1, with_globals))
+            return None if None in parts else f"partial({','.join(parts)})"
+        if isinstance(value, (classmethod, staticmethod)):
+            wrapped = self._value_fingerprint(value.__func__, depth + 1, with_globals)
+            return None if wrapped is None else f"{value_type.__qualname__}({wrapped})"
+        if isinstance(value, property):
+            parts = [self._value_fingerprint(accessor, depth + 1, with_globals)
+                     for accessor in (value.fget, value.fset, value.fdel)]
+            return None if None in parts else f"property({','.join(parts)})"
+        if isinstance(value, (types.MemberDescriptorType, types.GetSetDescriptorType, types.WrapperDescriptorType)):
+            # made by python for the class itself, e.g. slots
+            return f"{value_type.__qualname__} {value.__name__}"
+        if isinstance(value, FieldRule):
+            parts = (self._value_fingerprint(value.name, depth + 1, with_globals),
+                     self._value_fingerprint(value.checks, depth + 1, with_globals),
+                     self._value_fingerprint(value.storage, depth + 1, with_globals),
+                     'missing' if value.default is _MISSING else
+                     self._value_fingerprint(value.default, depth + 1, with_globals))
+            return None if None in parts else f"field rule({','.join(parts)})"
+        if isinstance(value, dataclasses.Field):
+            parts = [self._value_fingerprint(getattr(value, name), depth + 1, with_globals)
+                     if getattr(value, name) is not dataclasses.MISSING else 'missing'
+                     for name in ('name', 'type', 'default', 'default_factory', 'init', 'compare')]
+            return None if None in parts else f"field({','.join(parts)})"
+        if (value_type.__name__ == '_DataclassParams' and value_type.__module__ == 'dataclasses') or \
+                value_type.__module__ == 'typing':
+            # e.g. typing.List[int] in annotations
+            return repr(value)
+        return None
+
+    def _attributes_fingerprint(self, cls_instance: type):
+        parts = []
+        for klass in cls_instance.__mro__:
+            if klass.__module__ == 'builtins':
+                continue
+            for name, value in sorted(vars(klass).items()):
+                if name.startswith('_decorules'):
+                    # bookkeeping of decorules itself, e.g. the cached instance plan
+                    continue
+                shown = self._value_fingerprint(value)
+                if shown is None:
+                    return None
+                parts.append(f"{klass.__qualname__}.{name}={shown}")
+        return ';'.join(parts)
+
+    def _class_fingerprint(self, cls_instance: type):
+        # the attributes as they are now: the objects they are bound to and the contents of the mutable ones
+        state = tuple((name, id(value), self._value_fingerprint(value) if isinstance(value, _MUTABLE_TYPES) else None)
+                      for klass in cls_instance.__mro__ for name, value in vars(klass).items())
+        known = self._class_fingerprints.get(cls_instance)
+        if known is not None and known[0] == state:
+            return known[1]
+        fingerprint = None
+        attributes = self._attributes_fingerprint(cls_instance)
+        if attributes is not None:
+            digest = hashlib.sha256(sys.implementation.cache_tag.encode())
+            for klass in cls_instance.__mro__:
+                if klass.__module__ == 'builtins':
+                    continue
+                file_hash = self._file_hash(getattr(sys.modules.get(klass.__module__), '__file__', None))
+                if file_hash is None:
+                    digest = None
+                    break
+                digest.update(f"{klass.__module__}.{klass.__qualname__}:{file_hash};".encode())
+            if digest is not None:
+                digest.update(attributes.encode())
+                fingerprint = digest.hexdigest()
+        self._class_fingerprints[cls_instance] = (state, fingerprint)
+        return fingerprint
+
+    @staticmethod
+    def _looked_up(func) -> bool:
+        # member_enforcer checks cost less than looking them up
+        return member_enforcer_arguments(getattr(func, '__wrapped__', func)) is None
+
+    def _rule_fingerprint(self, func):
+        predicate = getattr(func, '__wrapped__', func)
+        try:
+            mutable_globals, states, fingerprint = self._rule_fingerprints[func]
+        except (KeyError, TypeError):
+            pass
+        else:
+            # e.g. a module level set that was added to since
+            if tuple(self._value_fingerprint(value, with_globals=True) for value in mutable_globals) == states:
+                return fingerprint
+        fingerprint = None
+        self._mutable_globals = []
+        try:
+            shown = self._value_fingerprint(predicate, with_globals=True)
+            if shown is not None:
+                fingerprint = f"{rule_identity(predicate)}:{hashlib.sha256(shown.encode()).hexdigest()}"
+            mutable_globals = tuple(self._mutable_globals)
+        finally:
+            self._mutable_globals = None
+        states = tuple(self._value_fingerprint(value, with_globals=True) for value in mutable_globals)
+        try:
+            self._rule_fingerprints[func] = (mutable_globals, states, fingerprint)
+        except TypeError:
+            # no weak references to it
+            pass
+        return fingerprint
+
+    def _key(self, cls_instance: type, func):
+        rule_fingerprint = self._rule_fingerprint(func)
+        if rule_fingerprint is None:
+            return None
+        class_fingerprint = self._class_fingerprint(cls_instance)
+        if class_fingerprint is None:
+            return None
+        return f"{cls_instance.__module__}.{cls_instance.__qualname__}", class_fingerprint, rule_fingerprint
+
+    def _passed_rules(self, class_name: str, class_fingerprint: str) -> set:
+        # all entries of the class are read at once, its other checks are then looked up in memory
+        passed = self._passed.get((class_name, class_fingerprint))
+        if passed is None:
+            connection = self._connect()
+            if connection is None:
+                return set()
+            try:
+                passed = {row[0] for row in connection.execute(
+                    "SELECT rule_fingerprint FROM passed_class_checks WHERE class_name = ? AND "
+                    "class_fingerprint = ?", (class_name, class_fingerprint))}
+            except sqlite3.Error:
+                self._broken = True
+                return set()
+            self._passed[class_name, class_fingerprint] = passed
+        return passed
+
+    def passed(self, cls_instance: type, func) -> bool:
+        """
+        Whether the class check func is known to pass on the class as it is now
+        """
+        if not self._looked_up(func):
+            return False
+        with self._lock:
+            key = None if self._broken else self._key(cls_instance, func)
+            found = key is not None and key[2] in self._passed_rules(key[0], key[1])
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return found
+
+    def record(self, cls_instance: type, func):
+        """
+        Records that the class check func passed on the class
+        """
+        if not self._looked_up(func):
+            return
+        with self._lock:
+            key = None if self._broken else self._key(cls_instance, func)
+            if key is None:
+                return
+            connection = self._connect()
+            if connection is None:
+                return
+            try:
+                with connection:
+                    connection.execute("INSERT OR IGNORE INTO passed_class_checks VALUES (?, ?, ?)", key)
+            except sqlite3.Error:
+                self._broken = True
+                return
+            self._passed_rules(key[0], key[1]).add(key[2])
+
+    def clear(self):
+        """
+        Removes all entries, including the ones left behind by classes or rules that changed since
+        """
+        with self._lock:
+            self._passed.clear()
+            connection = self._connect()
+            if connection is not None:
+                with connection:
+                    connection.execute("DELETE FROM passed_class_checks")
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
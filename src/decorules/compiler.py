@@ -0,0 +1,124 @@
+import types
+from decorules.utils import Purpose, member_enforcer_arguments
+from decorules.fields import FieldRule
+
+# merges the member_enforcer rules of an instance plan into generated functions. a generated function fetches every
+# attribute once and checks each type once per attribute. the checks are only evaluated in the generated code, when
+# one fails the original rule wrapper is called, so the exception type and message stay exactly the same.
+# attributes stored in __slots__ are read through their slot descriptor directly rather than through getattr.
+
+
+def _member_rule_arguments(func):
+    if getattr(func, 'purpose', None) != Purpose.RULE or getattr(func, 'memoization', None) is not None:
+        return None
+    return member_enforcer_arguments(getattr(func, '__wrapped__', None))
+
+
+def slot_descriptor(cls_instance: type, name: str):
+    """
+    The slot descriptor through which instances of cls_instance store the attribute name, or None if the attribute is
+    not a slot (or getattr could find it elsewhere)
+    """
+    if cls_instance.__getattribute__ is not object.__getattribute__ or hasattr(cls_instance, '__getattr__'):
+        return None
+    for klass in cls_instance.__mro__:
+        if name in vars(klass):
+            attribute = vars(klass)[name]
+            if isinstance(attribute, FieldRule):
+                # a slot with rules on assignment, reading it checks nothing
+                attribute = attribute.storage
+            return attribute if isinstance(attribute, types.MemberDescriptorType) else None
+    return None
+
+
+def _generate_member_rules(rules: list, cls_instance: type = None):
+    namespace = {}
+    lines = ["def compiled_member_rules(instance):"]
+    fetched_values = {}
+    checked_types = set()
+    for index, (func, arguments) in enumerate(rules):
+        namespace[f"_rule_{index}"] = func
+        namespace[f"_type_{index}"] = arguments['enforced_type']
+        enforced_key = arguments['enforced_key']
+        key_name = f"_key_{index}"
+        namespace[key_name] = enforced_key
+        if enforced_key not in fetched_values:
+            fetched_values[enforced_key] = f"_value_{index}"
+            descriptor = slot_descriptor(cls_instance, enforced_key) if cls_instance is not None else None
+            if descriptor is None:
+                lines.append(f"    _value_{index} = getattr(instance, {key_name}, None)")
+            else:
+                namespace[f"_slot_{index}"] = descriptor.__get__
+                lines.append(f"    try:")
+                lines.append(f"        _value_{index} = _slot_{index}(instance)")
+                lines.append(f"    except AttributeError:")
+                lines.append(f"        _value_{index} = None")
+        value = fetched_values[enforced_key]
+        type_check = (enforced_key, arguments['enforced_type'])
+        if arguments['attrs_used'] is not None:
+            # the fallback attributes are particular to this rule, so is the value they lead to
+            namespace[f"_attrs_{index}"] = arguments['attrs_used']
+            lines.append(f"    _member = {value}")
+            lines.append(f"    if _member is None:")
+            lines.append(f"        _member = _attrs_{index}.get({key_name}, None)")
+            value = "_member"
+            type_check = None
+        comparison = ""
+        if arguments['comparison_value'] is not None and arguments['operator_used'] is not None:
+            namespace[f"_operator_{index}"] = arguments['operator_used']
+            namespace[f"_comparison_{index}"] = arguments['comparison_value']
+            comparison = f"_operator_{index}({value}, _comparison_{index}) is False"
+        if type_check is None or type_check not in checked_types:
+            lines.append(f"    if {value} is None or not issubclass(type({value}), _type_{index}):")
+            lines.append(f"        _rule_{index}(instance)")
+            if comparison:
+                lines.append(f"    elif {comparison}:")
+                lines.append(f"        _rule_{index}(instance)")
+            if type_check is not None:
+                checked_types.add(type_check)
+        elif comparison:
+            # an earlier rule already established the value is present and of the right type
+            lines.append(f"    if {comparison}:")
+            lines.append(f"        _rule_{index}(instance)")
+    exec(compile("\n".join(lines), "<decorules compiled member rules>", "exec"), namespace)
+    compiled = namespace["compiled_member_rules"]
+    compiled.compiled_from = tuple(func for func, _ in rules)
+    rule_ids = [getattr(func, 'rule_id', repr(func)) for func in compiled.compiled_from]
+    compiled.rule_id = rule_ids[0] if len(rule_ids) == 1 else f"compiled({', '.join(rule_ids)})"
+    compiled.purpose = Purpose.RULE
+    compiled.reads = frozenset(arguments['enforced_key'] for _, arguments in rules)
+    return compiled
+
+
+def compile_member_rules(functions: tuple, excluded_rule_ids=frozenset(), cls_instance: type = None) -> tuple:
+    """
+    Replaces every run of two or more consecutive member_enforcer rules in functions by a single generated function.
+    The order of the functions is kept, other functions (including actions and the rules with an identity in
+    excluded_rule_ids) are left as they are. Given the class the functions check, its slots are read through their
+    descriptors and a single rule on a slot is replaced as well.
+    """
+    compiled = []
+    member_rules = []
+
+    def worth_generating():
+        if len(member_rules) > 1:
+            return True
+        return cls_instance is not None and any(slot_descriptor(cls_instance, arguments['enforced_key']) is not None
+                                                for _, arguments in member_rules)
+
+    def flush():
+        if member_rules and worth_generating():
+            compiled.append(_generate_member_rules(member_rules, cls_instance))
+        else:
+            compiled.extend(func for func, _ in member_rules)
+        member_rules.clear()
+
+    for func in functions:
+        arguments = _member_rule_arguments(func)
+        if arguments is not None and getattr(func, 'rule_id', None) not in excluded_rule_ids:
+            member_rules.append((func, arguments))
+        else:
+            flush()
+            compiled.append(func)
+    flush()
+    return tuple(compiled)
@@ -1,8 +1,13 @@
+import inspect
 import types
 from typing import Type
 from functools import wraps, partial
 from decorules.has_rules_actions import HasRulesActions, EnforcedFunctions
-from decorules.utils import Purpose
+from decorules.utils import Purpose, rule_identity, member_enforcer_arguments, attrs_parameter
+from decorules.policies import EnforcementPolicy, run_with_policy, arun_with_policy
+from decorules.executors import ActionExecution
+from decorules.memoize import Memoization
+from decorules.fields import value_check
 
 
 def _construct_and_raise(exception_type: Type[BaseException], *args, **kwargs):
@@ -13,33 +18,101 @@ def _run_func_if_false(enforced_function: types.FunctionType,
                        executed_function: types.FunctionType = partial(_construct_and_raise, Type[BaseException]),
                        on_class: bool = True,
                        extra_info: str = None,
-                       purpose: Purpose = Purpose.RULE):
+                       purpose: Purpose = Purpose.RULE,
+                       reads=None,
+                       policy: EnforcementPolicy = None,
+                       memoization: Memoization = None,
+                       on_assignment: bool = False):
     if extra_info is None:
         extra_info = ''
+    field_arguments = None
+    if on_assignment:
+        field_arguments = member_enforcer_arguments(enforced_function)
+        if field_arguments is None:
+            raise TypeError("Only rules created with member_enforcer can be checked on assignment")
+    if reads is None:
+        # the attribute checked by a member_enforcer is known, as are the ones a predicate declares itself,
+        # anything else could read any attribute
+        reads = getattr(enforced_function, 'reads', None)
+        member_arguments = member_enforcer_arguments(enforced_function)
+        if reads is None and member_arguments is not None:
+            reads = (member_arguments['enforced_key'],)
+    if reads is not None:
+        reads = frozenset(reads)
+    is_async = inspect.iscoroutinefunction(enforced_function) or (purpose == Purpose.ACTION and
+                                                                  inspect.iscoroutinefunction(executed_function))
+    if is_async and on_class:
+        raise TypeError("Class checks run when the class is defined and cannot be coroutine functions")
+    # the keyword through which a class check receives the namespace of the class being defined, found once here
+    attrs_keyword = attrs_parameter(enforced_function) if on_class else None
+    if memoization is not None and is_async:
+        raise TypeError("The outcomes of async predicates cannot be memoized")
+    # what gets called, enforced_function itself is what the rule is known by
+    predicate = enforced_function if memoization is None else memoization.memoized(enforced_function)
+
+    def async_run_func_when_false(cls, function_name):
+        class_name = cls.__class__.__name__
+
+        @wraps(enforced_function)
+        async def wrapped_run_func_when_false(instance):
+            outcome = enforced_function(instance)
+            if inspect.isawaitable(outcome):
+                outcome = await outcome
+            if outcome is False:
+                if purpose == Purpose.RULE:
+                    executed_function(f"{extra_info} {class_name} fails instance check {function_name}".strip())
+                elif purpose == Purpose.ACTION:
+                    executed = executed_function(instance)
+                    if inspect.isawaitable(executed):
+                        await executed
+                return False
+            return True
+
+        wrapped_run_func_when_false.rule_id = rule_identity(enforced_function)
+        wrapped_run_func_when_false.purpose = purpose
+        wrapped_run_func_when_false.reads = reads
+        wrapped_run_func_when_false.is_async = True
+        return wrapped_run_func_when_false
 
     def run_func_when_false(cls, function_name):
+        if is_async:
+            return async_run_func_when_false(cls, function_name)
+        # only the name is kept, holding on to cls would keep the class (and its registry entry) alive
+        class_name = cls.__class__.__name__
+
+        if on_class:
+            @wraps(enforced_function)
+            def wrapped_run_func_when_false(cls_instance, attrs: dict = None):
+                if attrs is None or attrs_keyword is None:
+                    passed = enforced_function(cls_instance)
+                else:
+                    passed = enforced_function(cls_instance, **{attrs_keyword: attrs})
+                if passed is False:
+                    executed_function(f"{extra_info} {class_name} fails class check {function_name}".strip())
+                    return False
+                return True
+
+            wrapped_run_func_when_false.rule_id = rule_identity(enforced_function)
+            wrapped_run_func_when_false.purpose = purpose
+            return wrapped_run_func_when_false
+
         @wraps(enforced_function)
         def wrapped_run_func_when_false(*args, **kwargs):
-            if on_class:
-                # if on a class, we need to check if attributes dictionary got passed
-                # if it did it needs to go on the kwargs
-                if len(args) > 1:
-                    # attrs should be the only dictionary argument
-                    dict_args = [x for x in args if isinstance(x, dict)]
-                    if len(dict_args) > 1:
-                        raise ValueError("Class enforcing function was called with more than one dictionary argument "
-                                         "(reserved for attributes)")
-                    else:
-                        kwargs['attrs'] = dict_args[0]
-                        args = tuple(x for x in args if x != dict_args[0])
-
-            if enforced_function(*args, **kwargs) is False:
+            if predicate(*args, **kwargs) is False:
                 if purpose == Purpose.RULE:
-                    error_str = f"{extra_info} {cls.__class__.__name__} fails {'class' if on_class else 'instance'} check {function_name}".strip()
+                    error_str = f"{extra_info} {class_name} fails instance check {function_name}".strip()
                     executed_function(error_str)
                 elif purpose == Purpose.ACTION:
                     executed_function(args[0])  # note not cls as cls is the type, we need the instance
+                return False
+            return True
 
+        wrapped_run_func_when_false.rule_id = rule_identity(enforced_function)
+        wrapped_run_func_when_false.purpose = purpose
+        wrapped_run_func_when_false.reads = reads
+        if memoization is not None:
+            # not the bare member_enforcer any more, which the compiler would otherwise merge into generated code
+            wrapped_run_func_when_false.memoization = memoization
         return wrapped_run_func_when_false
 
     if on_class:
@@ -50,8 +123,8 @@ def _run_func_if_false(enforced_function: types.FunctionType,
                     f"use a decorules decorator")
             function_name = str(enforced_function)
             func_to_add = run_func_when_false(cls, function_name)
-            EnforcedFunctions.add_enforce_function_to_class(cls.__name__, func_to_add)
-            func_to_add(cls)
+            EnforcedFunctions.add_enforce_function_to_class(cls, func_to_add)
+            EnforcedFunctions.run_class_check(cls, func_to_add)
             return cls
 
         return wrapped_class_with_enforced_rules
@@ -62,9 +135,18 @@ def _run_func_if_false(enforced_function: types.FunctionType,
                     f"{cls.__class__.__name__} must be of type {HasRulesActions.__class__.__name__} in order to use "
                     f"the decorator raiseErrorIfFalse on instance creation")
             function_name = str(enforced_function)
-            EnforcedFunctions.add_enforce_function_to_instance(cls.__name__,
-                                                               run_func_when_false(cls, function_name),
-                                                               purpose)
+            func_to_add = run_func_when_false(cls, function_name)
+            EnforcedFunctions.add_enforce_function_to_instance(cls, func_to_add, purpose)
+            if is_async:
+                # plain guarded methods of the class would skip it without a word
+                EnforcedFunctions.check_guarded_methods_can_run(cls)
+            if policy is not None:
+                EnforcedFunctions.set_policy(cls, policy, func_to_add.rule_id)
+            if field_arguments is not None:
+                error_str = f"{extra_info} {cls.__class__.__name__} fails instance check {function_name}".strip()
+                EnforcedFunctions.add_field_rule(cls, field_arguments['enforced_key'],
+                                                 value_check(**field_arguments),
+                                                 partial(executed_function, error_str))
             # this now needs to be checked at every instance not on class type instantiation
             return cls
 
@@ -84,38 +166,171 @@ def raise_if_false_on_class(enforced_function: types.FunctionType,
 
 def raise_if_false_on_instance(enforced_function: types.FunctionType,
                                exception_type: Type[BaseException] = Type[ValueError],
-                               extra_info: str = None):
+                               extra_info: str = None,
+                               reads=None,
+                               policy: EnforcementPolicy = None,
+                               memoize=False,
+                               on_assignment: bool = False):
     # do not use exception_type=exception_type in the below (confuses python)
+    # reads: the names of the attributes the rule depends on, used by run_changed_instance_rules
+    # policy: decides which checks of this rule run (see decorules.policies), changeable with EnforcedFunctions.set_policy
+    # memoize: True or a decorules.memoize.Memoization, caches the outcome for hashable or versioned instances
+    # on_assignment: for a member_enforcer, also checks every value assigned to the member (see decorules.fields)
+    if memoize is True:
+        memoize = Memoization()
     return _run_func_if_false(enforced_function,
                               partial(_construct_and_raise, exception_type),
                               on_class=False,
                               extra_info=extra_info,
-                              purpose=Purpose.RULE)
+                              purpose=Purpose.RULE,
+                              reads=reads,
+                              policy=policy,
+                              memoization=memoize if isinstance(memoize, Memoization) else None,
+                              on_assignment=on_assignment)
 
 
 def run_if_false_on_instance(enforced_function: types.FunctionType,
-                             executed_function: types.FunctionType):
+                             executed_function: types.FunctionType,
+                             reads=None,
+                             execution: ActionExecution = None):
     # do not use exception_type=exception_type in the below (confuses python)
+    # execution: runs executed_function off the instantiation or guarded method, see decorules.executors
+    if execution is not None:
+        if inspect.iscoroutinefunction(executed_function):
+            raise TypeError("async actions are awaited and cannot be given an execution")
+        executed_function = partial(execution.submit, executed_function)
     return _run_func_if_false(enforced_function,
                               executed_function,
                               on_class=False,
                               extra_info=None,
-                              purpose=Purpose.ACTION)
+                              purpose=Purpose.ACTION,
+                              reads=reads)
 
 
-def run_instance_rules(input_method):
-    @wraps(input_method)
-    def wrapped_method(self, *args, **kwargs):
-        input_method(self, *args, **kwargs)
-        EnforcedFunctions.run_functions_applied_to_instance(self, Purpose.RULE)
+def _guard_coroutine(input_method, run_functions, policy: EnforcementPolicy = None):
+    # coroutine methods are awaited first, then the instance functions including the async ones
+    if policy is None:
+        @wraps(input_method)
+        async def wrapped_method(self, *args, **kwargs):
+            result = await input_method(self, *args, **kwargs)
+            await run_functions(self)
+            return result
+    else:
+        @wraps(input_method)
+        async def wrapped_method(self, *args, **kwargs):
+            result = await input_method(self, *args, **kwargs)
+            await arun_with_policy(policy, run_functions, self)
+            return result
 
+    wrapped_method.guarded = True
+    return wrapped_method
+
+
+def run_instance_rules(input_method=None, *, policy: EnforcementPolicy = None):
+    """
+    Runs the instance rules after every call of the method. With a policy (see decorules.policies) the rules are only
+    run after the calls it allows, on top of the policies set on the class or the rules.
+
+    Use as @run_instance_rules or @run_instance_rules(policy=EveryNth(100))
+    """
+    if input_method is None:
+        return partial(run_instance_rules, policy=policy)
+    if inspect.iscoroutinefunction(input_method):
+        return _guard_coroutine(input_method,
+                                partial(EnforcedFunctions.arun_functions_applied_to_instance, purpose=Purpose.RULE),
+                                policy)
+
+    if policy is None:
+        @wraps(input_method)
+        def wrapped_method(self, *args, **kwargs):
+            result = input_method(self, *args, **kwargs)
+            EnforcedFunctions.run_functions_applied_to_instance(self, Purpose.RULE)
+            return result
+    else:
+        @wraps(input_method)
+        def wrapped_method(self, *args, **kwargs):
+            result = input_method(self, *args, **kwargs)
+            run_with_policy(policy, EnforcedFunctions.run_functions_applied_to_instance, self, Purpose.RULE)
+            return result
+
+    # marks the methods EnforcedFunctions.disable swaps back for input_method
+    wrapped_method.guarded = True
+    # the purposes of the functions a method that is not a coroutine runs, it cannot await any of them
+    wrapped_method.sync_purposes = (Purpose.RULE,)
     return wrapped_method
 
 
 def run_instance_actions(input_method):
+    if inspect.iscoroutinefunction(input_method):
+        return _guard_coroutine(input_method,
+                                partial(EnforcedFunctions.arun_functions_applied_to_instance, purpose=Purpose.ACTION))
+
     @wraps(input_method)
     def wrapped_method(self, *args, **kwargs):
-        input_method(self, *args, **kwargs)
+        result = input_method(self, *args, **kwargs)
         EnforcedFunctions.run_functions_applied_to_instance(self, Purpose.ACTION)
+        return result
+
+    wrapped_method.guarded = True
+    wrapped_method.sync_purposes = (Purpose.ACTION,)
+    return wrapped_method
+
+
+def run_instance_rules_and_actions(input_method):
+    if inspect.iscoroutinefunction(input_method):
+        return _guard_coroutine(input_method, EnforcedFunctions.arun_rules_and_actions_applied_to_instance)
+
+    @wraps(input_method)
+    def wrapped_method(self, *args, **kwargs):
+        result = input_method(self, *args, **kwargs)
+        EnforcedFunctions.run_rules_and_actions_applied_to_instance(self)
+        return result
 
+    wrapped_method.guarded = True
+    wrapped_method.sync_purposes = (Purpose.RULE, Purpose.ACTION)
     return wrapped_method
+
+
+def run_changed_instance_rules(*touched):
+    """
+    Like run_instance_rules, but only runs the rules reading an attribute that changed during the method call (and
+    the rules that did not declare what they read, see the reads argument of raise_if_false_on_instance). The
+    attributes of the instance are compared before and after the call (see EnforcedFunctions.tracking_changes), which
+    costs a copy of its __dict__ and slots per call. Attributes that are mutated in place (e.g. a list that is
+    appended to) need to be given as arguments.
+
+    Use as @run_changed_instance_rules or @run_changed_instance_rules('to_process_list')
+    """
+    if len(touched) == 1 and callable(touched[0]):
+        return run_changed_instance_rules()(touched[0])
+    touched = frozenset(touched)
+
+    def wrap_method(input_method):
+        if inspect.iscoroutinefunction(input_method):
+            raise TypeError("run_changed_instance_rules cannot guard coroutine methods, use run_instance_rules")
+
+        @wraps(input_method)
+        def wrapped_method(self, *args, **kwargs):
+            with EnforcedFunctions.tracking_changes(self, touched) as changed:
+                result = input_method(self, *args, **kwargs)
+            EnforcedFunctions.run_changed_functions_applied_to_instance(self, changed, Purpose.RULE)
+            return result
+
+        wrapped_method.guarded = True
+        wrapped_method.sync_purposes = (Purpose.RULE,)
+        return wrapped_method
+
+    return wrap_method
+
+
+def compile_member_enforcers(cls):
+    """
+    Class decorator merging the member_enforcer instance rules of the class (and its bases) into a single generated
+    function per run of consecutive rules. Exceptions and their messages are the same as without compilation.
+    """
+    if not issubclass(type(cls), HasRulesActions):
+        raise TypeError(
+            f"{cls.__class__.__name__} must be of type {HasRulesActions.__class__.__name__} in order to use "
+            f"the decorator compile_member_enforcers")
+    EnforcedFunctions.enable_member_rule_compilation(cls)
+    return cls
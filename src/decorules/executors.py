@@ -0,0 +1,159 @@
+import queue
+import threading
+from enum import Enum
+
+# the functions run by run_if_false_on_instance are called inline by default, inside the instantiation or the guarded
+# method. an execution given to the decorator takes them off that path. the action receives the instance itself and
+# sees it as it is when the action runs, which may be after later changes.
+
+
+class DropPolicy(Enum):
+    BLOCK = 1  # wait for room in the queue (backpressure on the caller)
+    DROP_NEWEST = 2  # discard the action being submitted
+    DROP_OLDEST = 3  # discard the action that waited the longest
+
+
+class ActionExecution:
+    """
+    Base class of the executions, runs actions inline. Exceptions raised by actions not run inline are kept in errors.
+    """
+
+    def __init__(self):
+        self.errors = []
+
+    def submit(self, func, instance):
+        func(instance)
+
+    def flush(self, timeout: float = None):
+        """
+        Waits until all submitted actions have run
+        """
+        pass
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stops accepting actions, with wait the submitted ones are run first
+        """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+class InlineExecution(ActionExecution):
+    pass
+
+
+class ThreadPoolExecution(ActionExecution):
+    """
+    Runs actions on a pool of threads
+    """
+
+    def __init__(self, max_workers: int = None):
+        # imported here to keep concurrent.futures out of the import of decorules
+        from concurrent.futures import ThreadPoolExecutor
+        super().__init__()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='decorules-action')
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+        if future.exception() is not None:
+            self.errors.append(future.exception())
+
+    def submit(self, func, instance):
+        future = self._executor.submit(func, instance)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+
+    def flush(self, timeout: float = None):
+        from concurrent.futures import wait
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending, timeout=timeout)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+class BoundedQueueExecution(ActionExecution):
+    """
+    Runs actions one at a time on a worker thread draining a queue of at most max_size actions. When the queue is full
+    drop_policy decides between blocking the caller and dropping an action, dropped counts the dropped actions.
+    """
+
+    def __init__(self, max_size: int = 1000, drop_policy: DropPolicy = DropPolicy.BLOCK):
+        if max_size < 1:
+            raise ValueError(f"max_size must be at least 1, not {max_size}")
+        super().__init__()
+        self.drop_policy = drop_policy
+        self.dropped = 0
+        self._queue = queue.Queue(max_size)
+        self._closed = False
+        self._worker = threading.Thread(target=self._drain, name='decorules-action-queue', daemon=True)
+        self._worker.start()
+
+    def _drain(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                func, instance = item
+                func(instance)
+            except Exception as ex:
+                self.errors.append(ex)
+            finally:
+                self._queue.task_done()
+
+    def submit(self, func, instance):
+        if self._closed:
+            raise RuntimeError("cannot submit actions after shutdown")
+        if self.drop_policy == DropPolicy.BLOCK:
+            self._queue.put((func, instance))
+            return
+        while True:
+            try:
+                self._queue.put_nowait((func, instance))
+                return
+            except queue.Full:
+                if self.drop_policy == DropPolicy.DROP_NEWEST:
+                    self.dropped += 1
+                    return
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+
+    def flush(self, timeout: float = None):
+        if timeout is None:
+            self._queue.join()
+            return
+        # Queue.join has no timeout
+        with self._queue.all_tasks_done:
+            self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def shutdown(self, wait: bool = True):
+        if self._closed:
+            return
+        self._closed = True
+        if not wait:
+            # drop whatever has not started yet
+            try:
+                while True:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+                    self.dropped += 1
+            except queue.Empty:
+                pass
+        self._queue.put(None)
+        if wait:
+            self._worker.join()
@@ -0,0 +1,141 @@
+import types
+
+# single field rules (a member_enforcer given to raise_if_false_on_instance with on_assignment=True) are installed on the
+# class as a data descriptor checking every value assigned to the field, before it is stored. the value is stored where
+# it would have been without the descriptor: in the slot it replaces or in the instance __dict__ under the same name.
+
+_MISSING = object()
+
+
+def value_check(enforced_type: type, comparison_value=None, operator_used=None, attrs_used: dict = None,
+                enforced_key: str = None):
+    """
+    The check of a member_enforcer (see utils.member_enforcer) on a value rather than on an object holding it
+    """
+
+    def check(value) -> bool:
+        if value is None and attrs_used is not None:
+            value = attrs_used.get(enforced_key, None)
+        if value is None or not issubclass(type(value), enforced_type):
+            return False
+        if comparison_value is not None and operator_used is not None:
+            return operator_used(value, comparison_value)
+        return True
+
+    return check
+
+
+class FieldRule:
+    """
+    Data descriptor running checks on every value assigned to the field name. checks holds (check, on_failure) pairs,
+    on_failure is called (and raises) when a check returns False. Values are stored in storage (a slot descriptor) or
+    the instance __dict__, default is what the field holds when nothing was assigned (the class attribute it replaced).
+    """
+
+    def __init__(self, name: str, checks: tuple, storage=None, default=_MISSING):
+        self.name = name
+        self.checks = checks
+        self.storage = storage
+        self.default = default
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            if self.default is not _MISSING:
+                return self.default
+            if self.storage is not None:
+                return self.storage
+            return self
+        if self.storage is not None:
+            return self.storage.__get__(instance, owner)
+        try:
+            return instance.__dict__[self.name]
+        except KeyError:
+            if self.default is _MISSING:
+                raise AttributeError(f"'{type(instance).__name__}' object has no attribute '{self.name}'") from None
+            return self.default
+
+    def __set__(self, instance, value):
+        for check, on_failure in self.checks:
+            if check(value) is False:
+                on_failure()
+        if self.storage is not None:
+            self.storage.__set__(instance, value)
+        else:
+            instance.__dict__[self.name] = value
+
+    def __delete__(self, instance):
+        if self.storage is not None:
+            self.storage.__delete__(instance)
+            return
+        try:
+            del instance.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name) from None
+
+    # a field with checks is guarded like the methods of run_instance_rules, EnforcedFunctions.disable swaps it for
+    # the same field without checks
+    @property
+    def guarded(self) -> bool:
+        return bool(self.checks)
+
+    @property
+    def __wrapped__(self):
+        return FieldRule(self.name, (), self.storage, self.default)
+
+    def with_check(self, check, on_failure) -> 'FieldRule':
+        return FieldRule(self.name, self.checks + ((check, on_failure),), self.storage, self.default)
+
+    def with_storage(self, attribute):
+        """
+        The same checks on a class (deriving from the one holding this field) that redefines the field as attribute:
+        a slot or a new default value. None if the class replaces the field by something else, e.g. a property.
+        """
+        if isinstance(attribute, types.MemberDescriptorType):
+            return FieldRule(self.name, self.checks, storage=attribute)
+        if isinstance(attribute, FieldRule) or hasattr(type(attribute), '__get__'):
+            return None
+        return FieldRule(self.name, self.checks, default=attribute)
+
+
+def class_attribute(cls_instance: type, name: str):
+    # the attribute as found by looking up name on the class, without calling any descriptor
+    for klass in cls_instance.__mro__:
+        if name in vars(klass):
+            return vars(klass)[name]
+    return _MISSING
+
+
+def field_rule_for(cls_instance: type, name: str, check, on_failure) -> FieldRule:
+    """
+    The field rule to install on cls_instance for name, adding check to the checks already on the field if any
+    """
+    existing = class_attribute(cls_instance, name)
+    if isinstance(existing, FieldRule):
+        return existing.with_check(check, on_failure)
+    field_rule = FieldRule(name, ((check, on_failure),))
+    if existing is _MISSING:
+        return field_rule
+    with_storage = field_rule.with_storage(existing)
+    if with_storage is None:
+        raise TypeError(f"{cls_instance.__name__}.{name} is a {type(existing).__name__}, rules on assignment need a "
+                        f"plain class attribute, a slot or no attribute at all")
+    return with_storage
+
+
+def reinstall_field_rules(cls_instance: type, attrs: dict, names: set, guarded_attributes=None):
+    """
+    Installs the field rules of the bases of cls_instance again on it for the fields it redefines in attrs (its
+    namespace), which would otherwise hide them. guarded_attributes ({class: {name: attribute}}) holds the fields
+    with their checks of the bases whose checks are disabled, these are installed rather than the ones without checks.
+    """
+    for name in names.intersection(attrs):
+        base = next((base for base in cls_instance.__mro__[1:] if name in vars(base)), None)
+        if base is None:
+            continue
+        inherited = vars(base)[name]
+        if guarded_attributes is not None:
+            inherited = guarded_attributes.get(base, {}).get(name, inherited)
+        if isinstance(inherited, FieldRule):
+            replacement = inherited.with_storage(attrs[name])
+            if replacement is not None:
+                setattr(cls_instance, name, replacement)
@@ -1,8 +1,25 @@
+import inspect
+import os
+import threading
 import types
-from collections import defaultdict
-import types
-from collections import defaultdict
-from decorules.utils import false_on_raise_else_true, Purpose
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from decorules.utils import false_on_raise_else_true, Purpose, ValidationReport, rule_identity
+from decorules.compiler import compile_member_rules
+from decorules.profiling import RuleStats, profiled
+from decorules.policies import EnforcementPolicy, gated, gated_group
+from decorules.fields import FieldRule, field_rule_for, reinstall_field_rules
+
+# name of the class attribute holding the cached InstancePlan, every HasRulesActions class has its own
+_PLAN_ATTRIBUTE = '_decorules_instance_plan'
+# set to anything but 0 to disable all instance checks from the start (see EnforcedFunctions.disable)
+DISABLE_ENVIRONMENT_VARIABLE = 'DECORULES_DISABLE_INSTANCE_CHECKS'
+# set to anything but 0 to defer the class checks from the start (see EnforcedFunctions.verify_on_first_use)
+VERIFY_ON_FIRST_USE_ENVIRONMENT_VARIABLE = 'DECORULES_VERIFY_ON_FIRST_USE'
+# set to 1 (or the path of the database) to cache passing class checks from the start (see use_class_check_cache)
+CLASS_CHECK_CACHE_ENVIRONMENT_VARIABLE = 'DECORULES_CLASS_CHECK_CACHE'
 
 
 def get_all_base_classes(cls):
@@ -19,56 +36,331 @@ def get_all_base_classes(cls):
     return bases
 
 
+def _registered_functions(plan_func) -> tuple:
+    """
+    The functions as registered by the decorators behind a function of an InstancePlan
+    """
+    while getattr(plan_func, 'plan_wrapped', None) is not None:
+        plan_func = plan_func.plan_wrapped
+    members = getattr(plan_func, 'compiled_from', None) or getattr(plan_func, 'plan_group', None)
+    if members is None:
+        return plan_func,
+    return tuple(func for member in members for func in _registered_functions(member))
+
+
+def _guarded(attribute) -> bool:
+    # only functions, properties and field rules are looked at, e.g. a mock as class attribute has every attribute
+    if isinstance(attribute, types.FunctionType):
+        return vars(attribute).get('guarded', False) is True
+    if isinstance(attribute, property):
+        return any(_guarded(accessor) for accessor in (attribute.fget, attribute.fset, attribute.fdel))
+    return isinstance(attribute, FieldRule) and attribute.guarded
+
+
+def _sync_purposes(attribute) -> set:
+    # the purposes of the instance functions a guarded method that is not a coroutine method runs
+    if isinstance(attribute, property):
+        return {purpose for accessor in (attribute.fget, attribute.fset, attribute.fdel)
+                for purpose in _sync_purposes(accessor)}
+    if isinstance(attribute, types.FunctionType):
+        return set(vars(attribute).get('sync_purposes', ()))
+    return set()
+
+
+def _unguarded(attribute):
+    """
+    The attribute as it was before the decorators running instance checks wrapped it
+    """
+    if isinstance(attribute, property):
+        return attribute.__class__(*(_unguarded(accessor) for accessor in
+                                     (attribute.fget, attribute.fset, attribute.fdel)),
+                                   attribute.__doc__)
+    while _guarded(attribute):
+        attribute = attribute.__wrapped__
+    return attribute
+
+
+# class -> names of the slots of its instances (mangled as stored), see _attribute_state
+_slot_names = weakref.WeakKeyDictionary()
+_ABSENT = object()
+
+
+def _instance_slot_names(cls_instance: type) -> tuple:
+    names = _slot_names.get(cls_instance)
+    if names is None:
+        names = []
+        for klass in cls_instance.__mro__:
+            slots = vars(klass).get('__slots__', ())
+            for name in ((slots,) if isinstance(slots, str) else slots):
+                if name in ('__dict__', '__weakref__'):
+                    continue
+                if name.startswith('__') and not name.endswith('__'):
+                    name = f"_{klass.__name__.lstrip('_')}{name}"
+                names.append(name)
+        names = _slot_names[cls_instance] = tuple(names)
+    return names
+
+
+def _attribute_state(instance) -> dict:
+    """
+    The values of the attributes of an instance, its __dict__ and its slots, as a shallow copy
+    """
+    state = dict(getattr(instance, '__dict__', ()))
+    for name in _instance_slot_names(type(instance)):
+        state[name] = getattr(instance, name, _ABSENT)
+    return state
+
+
+class DeferredRulesError(Exception):
+    """
+    Raised when leaving EnforcedFunctions.deferred if any deferred instance check failed. failures holds the
+    (instance, exception) pairs of all failures.
+    """
+
+    def __init__(self, failures: list):
+        self.failures = failures
+        super().__init__(f"{len(failures)} deferred instance check(s) failed: " +
+                         "; ".join(f"{type(instance).__name__}: {exception}" for instance, exception in failures))
+
+
+class _DeferredChecks:
+    __slots__ = ('targets', 'outer', 'pending')
+
+    def __init__(self, instances: tuple, outer):
+        # None defers the checks of any instance
+        self.targets = {id(instance) for instance in instances} if instances else None
+        self.outer = outer
+        self.pending = {}
+
+    def defer(self, instance, purposes: tuple) -> bool:
+        deferral = self
+        while deferral is not None:
+            if deferral.targets is None or id(instance) in deferral.targets:
+                deferred = deferral.pending.setdefault(id(instance), (instance, set()))
+                deferred[1].update(purposes)
+                return True
+            deferral = deferral.outer
+        return False
+
+
+_deferred_checks = ContextVar('decorules_deferred_checks', default=None)
+# the class EnforcedFunctions.acreate is instantiating, its instance functions are awaited by acreate itself
+_created_by_acreate = ContextVar('decorules_created_by_acreate', default=None)
+
+
+class PurposeRegistry:
+    """
+    The enforced functions registered on a single class, kept apart per Purpose in registration order and without
+    duplicates. Iterating over it yields (func, purpose) pairs. A registry is never changed, registering a function
+    creates a new one (see EnforcedFunctions._register), so readers never see a registry being changed.
+    """
+    __slots__ = ('_functions',)
+
+    def __init__(self, functions: dict = None):
+        self._functions = functions if functions is not None else {purpose: () for purpose in Purpose}
+
+    def with_function(self, func, purpose: Purpose = Purpose.RULE) -> 'PurposeRegistry':
+        if func in self._functions[purpose]:
+            return self
+        return PurposeRegistry({**self._functions, purpose: self._functions[purpose] + (func,)})
+
+    def functions(self, purpose: Purpose = Purpose.RULE) -> tuple:
+        return self._functions[purpose]
+
+    def __iter__(self):
+        for purpose, functions in self._functions.items():
+            for func in functions:
+                yield func, purpose
+
+    def __len__(self):
+        return sum(len(functions) for functions in self._functions.values())
+
+
+class InstancePlan:
+    """
+    The flattened, ordered instance functions of a class and all of its HasRulesActions bases.
+    The class itself comes first, followed by its bases in method resolution order. Functions with async predicates
+    or actions are kept apart, they only run when awaited (see EnforcedFunctions.arun_functions_applied_to_instance).
+    """
+    __slots__ = ('rules', 'actions', 'async_rules', 'async_actions', 'rules_and_actions', 'is_async', 'is_empty',
+                 '_read_indices')
+
+    def __init__(self, rules: tuple = (), actions: tuple = (), async_rules: tuple = (), async_actions: tuple = ()):
+        self.rules = rules
+        self.actions = actions
+        self.async_rules = async_rules
+        self.async_actions = async_actions
+        # all rules first, the actions only run once every rule has passed
+        self.rules_and_actions = rules + actions
+        self.is_async = bool(async_rules or async_actions)
+        self.is_empty = not self.rules_and_actions and not self.is_async
+        self._read_indices = {}
+
+    def functions(self, purpose: Purpose = Purpose.RULE) -> tuple:
+        return self.rules if purpose == Purpose.RULE else self.actions
+
+    def _read_index(self, purpose: Purpose):
+        index = self._read_indices.get(purpose)
+        if index is None:
+            unconditional = []
+            by_attribute = {}
+            for position, func in enumerate(self.functions(purpose)):
+                reads = getattr(func, 'reads', None)
+                if reads is None:
+                    unconditional.append(position)
+                else:
+                    for name in reads:
+                        by_attribute.setdefault(name, []).append(position)
+            index = self._read_indices[purpose] = (frozenset(unconditional), by_attribute)
+        return index
+
+    def functions_reading(self, changed, purpose: Purpose = Purpose.RULE) -> tuple:
+        """
+        The functions that read any of the changed attribute names, or that did not declare what they read
+        """
+        functions = self.functions(purpose)
+        unconditional, by_attribute = self._read_index(purpose)
+        positions = set(unconditional)
+        for name in changed:
+            positions.update(by_attribute.get(name, ()))
+        if len(positions) == len(functions):
+            return functions
+        return tuple(functions[position] for position in sorted(positions))
+
+
 class HasRulesActions(type):
 
+    def __init__(cls, name, bases, attrs, **kwargs):
+        super().__init__(name, bases, attrs, **kwargs)
+        # set on every class so that the plan of a base is never picked up through inheritance
+        setattr(cls, _PLAN_ATTRIBUTE, None)
+        if EnforcedFunctions._field_rule_names:
+            # a field redefined here would hide the field rule of a base
+            reinstall_field_rules(cls, attrs, EnforcedFunctions._field_rule_names,
+                                  EnforcedFunctions._guarded_attributes)
+        if EnforcedFunctions._inheriting_class_checks:
+            # the class checks of the bases hold for this class too, its own are added (and run) by its decorators
+            EnforcedFunctions.run_inherited_functions_applied_to_class(cls, attrs)
+        with EnforcedFunctions._lock:
+            if any(_guarded(attribute) for attribute in attrs.values()):
+                EnforcedFunctions._classes_with_guarded_methods.add(cls)
+                if any(_sync_purposes(attribute) for attribute in attrs.values()):
+                    EnforcedFunctions.check_guarded_methods_can_run(cls)
+            if EnforcedFunctions.is_disabled(cls):
+                EnforcedFunctions._unguard(cls)
+
     def __call__(cls,
                  *args,
                  **kwargs):
+        plan = cls._decorules_instance_plan
+        if plan is None:
+            plan = EnforcedFunctions.get_instance_plan(cls)
+        if plan.is_empty:
+            # no instance level functions on the class or its bases, as cheap as a plain class
+            return super().__call__(*args, **kwargs)
+        if plan.is_async:
+            if _created_by_acreate.get() is not cls:
+                raise TypeError(f"{cls.__name__} has async instance rules or actions, which instantiation cannot "
+                                f"await, create its instances with await EnforcedFunctions.acreate({cls.__name__}, "
+                                f"...)")
+            # instances created while running __init__ are not created by acreate
+            token = _created_by_acreate.set(None)
+            try:
+                return super().__call__(*args, **kwargs)
+            finally:
+                _created_by_acreate.reset(token)
         # Create an object instance
         instance = super().__call__(*args, **kwargs)
         # We allow the derived classes to create an class instance
         # however they see fit and check any instance level checks here
         # all of them need to be checked at every instance creation!
-        EnforcedFunctions.run_functions_applied_to_instance(instance, Purpose.RULE)
-        EnforcedFunctions.run_functions_applied_to_instance(instance, Purpose.ACTION)
+        for func in plan.rules_and_actions:
+            func(instance)
         return instance
 
 
 class EnforcedFunctions:
-    _functions_applied_to_instance = defaultdict(set)
-    _functions_applied_to_class = defaultdict(set)
+    # serializes every change below, as well as building and dropping the instance plans. the PurposeRegistry of a
+    # class is never changed, registering swaps in a new one for that class only, so that reading the registries (and
+    # using the plans) never needs the lock
+    _lock = threading.RLock()
+    # keyed by the class object itself, entries go away together with the class
+    _functions_applied_to_instance = weakref.WeakKeyDictionary()
+    _functions_applied_to_class = weakref.WeakKeyDictionary()
+    _classes_compiling_member_rules = weakref.WeakSet()
+    _profiling = False
+    _rule_stats = weakref.WeakKeyDictionary()
+    # class -> {rule identity (None for the class itself): EnforcementPolicy}
+    _policies = weakref.WeakKeyDictionary()
+    _disabled_globally = False
+    _disabled_classes = weakref.WeakSet()
+    # class -> {name: guarded attribute} of the attributes replaced while the instance checks are disabled
+    _guarded_attributes = weakref.WeakKeyDictionary()
+    _classes_with_guarded_methods = weakref.WeakSet()
+    _verifying_on_first_use = False
+    _inheriting_class_checks = False
+    # class -> [(class check, attrs)] waiting for the first use of the class
+    _pending_class_checks = weakref.WeakKeyDictionary()
+    # class -> [number of class checks run, seconds spent on them, number of checks found in the cache]
+    _class_check_times = weakref.WeakKeyDictionary()
+    _class_check_cache = None
+    # names of the fields with rules on assignment on any class, see add_field_rule
+    _field_rule_names = set()
 
     @classmethod
     def _apply_functions_applied_to_class(cls, cls_instance: type, attrs: dict = None, purpose: Purpose = Purpose.RULE):
-        if cls._functions_applied_to_class[cls_instance.__name__]:
-            for func, func_purpose in cls._functions_applied_to_class[cls_instance.__name__]:
-                if func_purpose == purpose:
-                    func(cls_instance, attrs)
-            pass
-        pass
+        registry = cls._functions_applied_to_class.get(cls_instance)
+        if registry:
+            for func in registry.functions(purpose):
+                func(cls_instance, attrs)
 
     @classmethod
-    def _apply_functions_applied_to_instance(cls, instance, cls_key: str, purpose: Purpose = Purpose.RULE):
-        if cls._functions_applied_to_instance[cls_key]:
-            for func, func_purpose in cls._functions_applied_to_instance[cls_key]:
-                if func_purpose == purpose:
-                    func(instance)
-            pass
-        pass
+    def _apply_functions_applied_to_instance(cls, instance, cls_key: type, purpose: Purpose = Purpose.RULE):
+        registry = cls._functions_applied_to_instance.get(cls_key)
+        if registry:
+            for func in registry.functions(purpose):
+                func(instance)
+
+    @classmethod
+    def _register(cls, registries_name: str, cls_key: type, func, purpose: Purpose):
+        with cls._lock:
+            registries = getattr(cls, registries_name)
+            # a single item assignment, readers see either the old or the new registry of the class
+            registries[cls_key] = registries.get(cls_key, PurposeRegistry()).with_function(func, purpose)
 
     @classmethod
     def add_enforce_function_to_class(cls,
-                                      cls_key: str,
+                                      cls_key: type,
                                       func,
                                       purpose: Purpose = Purpose.RULE):
-        cls._functions_applied_to_class[cls_key].add((func, purpose))
+        cls._register('_functions_applied_to_class', cls_key, func, purpose)
 
     @classmethod
     def add_enforce_function_to_instance(cls,
-                                         cls_key: str,
+                                         cls_key: type,
                                          func,
                                          purpose: Purpose = Purpose.RULE):
-        cls._functions_applied_to_instance[cls_key].add((func, purpose))
+        with cls._lock:
+            cls._make_rule_id_unique(cls_key, func)
+            cls._register('_functions_applied_to_instance', cls_key, func, purpose)
+            cls.invalidate_instance_plans(cls_key)
+
+    @classmethod
+    def _make_rule_id_unique(cls, cls_key: type, func):
+        # e.g. lambdas made by the same factory share their identity, the profiling statistics, validation reports and
+        # policies of the instance functions of a class tell them apart by numbering the later ones
+        rule_id = getattr(func, 'rule_id', None)
+        if rule_id is None:
+            return
+        taken = {getattr(registered, 'rule_id', None)
+                 for klass in {*cls_key.__mro__, *cls._affected_classes(cls_key)}
+                 for registered, _ in cls._functions_applied_to_instance.get(klass, ()) if registered is not func}
+        number = 2
+        unique_id = rule_id
+        while unique_id in taken:
+            unique_id = f"{rule_id}#{number}"
+            number += 1
+        func.rule_id = unique_id
 
     @classmethod
     def run_functions_applied_to_class(cls,
@@ -79,53 +371,723 @@ class EnforcedFunctions:
             cls._apply_functions_applied_to_class(cls_instance, attrs, purpose)
             # the bases will get called individually with their own attrs if they are of type HasRulesActions
 
+    @classmethod
+    def run_inherited_functions_applied_to_class(cls, cls_instance: type, attrs: dict = None):
+        """
+        Runs the class checks registered on the bases of a class on the class itself, passing attrs (its namespace)
+        to the checks taking it
+        """
+        registries = cls._functions_applied_to_class
+        if not registries:
+            return
+        for klass in cls_instance.__mro__[1:]:
+            registry = registries.get(klass)
+            if registry:
+                for func in registry.functions(Purpose.RULE):
+                    cls.run_class_check(cls_instance, func, attrs)
+
+    @classmethod
+    def inherit_class_checks(cls, enabled: bool = True):
+        """
+        With enabled, the class checks of a class also run on every class deriving from it when that class is defined,
+        receiving its namespace (see run_inherited_functions_applied_to_class). By default they only run on the class
+        they decorate.
+        """
+        cls._inheriting_class_checks = enabled
+
+    @classmethod
+    def run_class_check(cls, cls_instance: type, func, attrs: dict = None):
+        """
+        Runs a class check on a class or, when verifying on first use, keeps it until the class is used. Every class
+        check goes through here, which also records the time spent on the checks per class (see class_check_report).
+        """
+        # disabled globally no plan is ever built, i.e. there is no first use to wait for
+        if cls._verifying_on_first_use and not cls._disabled_globally:
+            with cls._lock:
+                cls._pending_class_checks.setdefault(cls_instance, []).append((func, attrs))
+                # the check runs when the plan is (re)built, i.e. on first use
+                cls.invalidate_instance_plans(cls_instance)
+            return
+        cls._timed_class_check(cls_instance, func, attrs)
+
+    @classmethod
+    def _timed_class_check(cls, cls_instance: type, func, attrs: dict = None):
+        times = cls._class_check_times.setdefault(cls_instance, [0, 0.0, 0])
+        cache = cls._class_check_cache
+        start = perf_counter()
+        try:
+            if cache is not None and cache.passed(cls_instance, func):
+                times[2] += 1
+                return
+            if func(cls_instance, attrs) is not False and cache is not None:
+                cache.record(cls_instance, func)
+        finally:
+            times[0] += 1
+            times[1] += perf_counter() - start
+
+    @classmethod
+    def use_class_check_cache(cls, cache=None):
+        """
+        From now on class checks known to pass on an unchanged class are not run again, using cache (a
+        decorules.cache.ClassCheckCache, stored on disk and so shared between processes). None stops using a cache.
+        Setting the environment variable DECORULES_CLASS_CHECK_CACHE to 1 (or to the path of the database) uses one
+        from the start.
+        """
+        cls._class_check_cache = cache
+
+    @classmethod
+    def _run_pending_class_checks(cls, cls_instance: type):
+        pending = cls._pending_class_checks.pop(cls_instance, None)
+        while pending:
+            func, attrs = pending[0]
+            try:
+                cls._timed_class_check(cls_instance, func, attrs)
+            except BaseException:
+                # still pending, the next use fails again
+                cls._pending_class_checks[cls_instance] = pending
+                raise
+            pending.pop(0)
+
+    @classmethod
+    def verify_on_first_use(cls, enabled: bool = True):
+        """
+        With enabled, class checks are no longer run when a class is decorated (or defined, for the checks of its
+        bases) but when the class (or a class deriving from it) is first instantiated or guarded, or on verify_all.
+        This shortens the startup of applications defining many classes. Setting the environment variable
+        DECORULES_VERIFY_ON_FIRST_USE enables it from the start.
+        """
+        cls._verifying_on_first_use = enabled
+
+    @classmethod
+    def verify_all(cls):
+        """
+        Runs all class checks deferred by verify_on_first_use, raising the exception of the first that fails
+        """
+        with cls._lock:
+            for cls_instance in list(cls._pending_class_checks.keys()):
+                cls._run_pending_class_checks(cls_instance)
+
+    @classmethod
+    def class_check_report(cls) -> dict:
+        """
+        Returns {class: {'checks': number, 'seconds': time, 'cached': number}} of the class checks run so far
+        (deferred ones included once run, 'cached' of which were skipped as found in the class check cache), the most
+        expensive classes first, showing what each decorated class adds to the startup
+        """
+        report = {cls_instance: {'checks': times[0], 'seconds': times[1], 'cached': times[2]}
+                  for cls_instance, times in list(cls._class_check_times.items())}
+        return dict(sorted(report.items(), key=lambda item: item[1]['seconds'], reverse=True))
+
+    @classmethod
+    def check_guarded_methods_can_run(cls, cls_instance: type):
+        """
+        Raises a TypeError if a guarded method of the class or of a class deriving from it that is not a coroutine
+        method (e.g. a plain method with run_instance_rules) would have to run async rules or actions, which it cannot
+        await
+        """
+        for klass in cls._affected_classes(cls_instance):
+            cls._check_guarded_methods_of(klass)
+
+    @classmethod
+    def _check_guarded_methods_of(cls, cls_instance: type):
+        async_purposes = {purpose for klass in cls_instance.__mro__
+                          for func, purpose in cls._functions_applied_to_instance.get(klass, ())
+                          if getattr(func, 'is_async', False)}
+        if not async_purposes:
+            return
+        for klass in cls_instance.__mro__:
+            for name, attribute in vars(klass).items():
+                purposes = _sync_purposes(attribute) & async_purposes
+                if purposes:
+                    kinds = ' and '.join(sorted(purpose.name.lower() + 's' for purpose in purposes))
+                    raise TypeError(f"{cls_instance.__name__}.{name} is not a coroutine method and cannot await the "
+                                    f"async {kinds} of {cls_instance.__name__}, make it async (or run them with "
+                                    f"EnforcedFunctions.arun_functions_applied_to_instance)")
+
+    @classmethod
+    def _build_instance_plan(cls, cls_instance: type) -> InstancePlan:
+        if cls._pending_class_checks:
+            for klass in reversed(cls_instance.__mro__):
+                cls._run_pending_class_checks(klass)
+        if cls.is_disabled(cls_instance):
+            return InstancePlan()
+        rules = []
+        actions = []
+        for klass in cls_instance.__mro__:
+            if not issubclass(type(klass), HasRulesActions):
+                continue
+            registry = cls._functions_applied_to_instance.get(klass)
+            if registry:
+                rules.extend(registry.functions(Purpose.RULE))
+                actions.extend(registry.functions(Purpose.ACTION))
+        async_rules = tuple(func for func in rules if getattr(func, 'is_async', False))
+        async_actions = tuple(func for func in actions if getattr(func, 'is_async', False))
+        rules = tuple(func for func in rules if not getattr(func, 'is_async', False))
+        actions = tuple(func for func in actions if not getattr(func, 'is_async', False))
+        policies = cls._policies_for(cls_instance)
+        class_policy = policies.pop(None, None)
+        # instances without a __dict__ always get their slots read through the slot descriptors
+        if cls_instance.__dictoffset__ == 0 or any(klass in cls._classes_compiling_member_rules
+                                                   for klass in cls_instance.__mro__):
+            # rules with their own policy need to stay apart
+            rules = compile_member_rules(rules, frozenset(policies), cls_instance)
+        if cls._profiling:
+            rules = tuple(profiled(func, cls._stats_for(cls_instance, func)) for func in rules)
+            actions = tuple(profiled(func, cls._stats_for(cls_instance, func)) for func in actions)
+        if policies:
+            rules = tuple(cls._with_policy(cls_instance, func, policies) for func in rules)
+            actions = tuple(cls._with_policy(cls_instance, func, policies) for func in actions)
+        if class_policy is not None and rules:
+            stats = tuple(cls._stats_for(cls_instance, func) for func in rules) if cls._profiling else None
+            rules = (gated_group(rules, class_policy, stats),)
+        return InstancePlan(rules, actions, async_rules, async_actions)
+
+    @classmethod
+    def _with_policy(cls, cls_instance: type, func, policies: dict):
+        policy = policies.get(getattr(func, 'rule_id', None))
+        if policy is None:
+            return func
+        return gated(func, policy, cls._stats_for(cls_instance, func) if cls._profiling else None)
+
+    @classmethod
+    def _policies_for(cls, cls_instance: type) -> dict:
+        policies = {}
+        for klass in reversed(cls_instance.__mro__):
+            policies.update(cls._policies.get(klass, {}))
+        return policies
+
+    @classmethod
+    def set_policy(cls, cls_instance: type, policy: EnforcementPolicy = None, rule=None):
+        """
+        Sets the enforcement policy (see decorules.policies) of the instance rules of a class and its derived
+        classes, or of a single rule or action if given. The policy of a class decides once for all of its rules
+        (actions are not affected), the policy of a rule only for that rule. A policy of None removes the policy.
+        This takes effect immediately, without redefining any class.
+
+        :param rule: the predicate function given to the decorator or its identity (see utils.rule_identity), which is
+            numbered from #2 on for the later instance functions of a class sharing it, e.g. lambdas of one factory
+        """
+        if rule is not None and not isinstance(rule, str):
+            rule = rule_identity(rule)
+        with cls._lock:
+            class_policies = dict(cls._policies.get(cls_instance, {}))
+            if policy is None:
+                class_policies.pop(rule, None)
+            else:
+                class_policies[rule] = policy
+            cls._policies[cls_instance] = class_policies
+            cls.invalidate_instance_plans(cls_instance)
+
+    @classmethod
+    def get_policy(cls, cls_instance: type, rule=None) -> EnforcementPolicy:
+        if rule is not None and not isinstance(rule, str):
+            rule = rule_identity(rule)
+        return cls._policies_for(cls_instance).get(rule)
+
+    @classmethod
+    def get_instance_plan(cls, cls_instance: type) -> InstancePlan:
+        """
+        Returns the InstancePlan of a HasRulesActions class. The plan is built on first use and stored on the class
+        so that later instantiations and guarded method calls only iterate over a tuple.
+        """
+        plan = getattr(cls_instance, _PLAN_ATTRIBUTE)
+        if plan is None:
+            # built under the lock so that a plan can not be stored after a concurrent invalidation dropped it
+            with cls._lock:
+                plan = getattr(cls_instance, _PLAN_ATTRIBUTE)
+                if plan is None:
+                    plan = cls._build_instance_plan(cls_instance)
+                    setattr(cls_instance, _PLAN_ATTRIBUTE, plan)
+        return plan
+
+    @classmethod
+    def enable_member_rule_compilation(cls, cls_instance: type):
+        """
+        From now on, consecutive member_enforcer instance rules in the plans of the class and its derived classes
+        get merged into a single generated function (see compiler.compile_member_rules)
+        """
+        with cls._lock:
+            cls._classes_compiling_member_rules.add(cls_instance)
+            cls.invalidate_instance_plans(cls_instance)
+
+    @classmethod
+    def _stats_for(cls, cls_instance: type, func) -> RuleStats:
+        rule_id = getattr(func, 'rule_id', repr(func))
+        with cls._lock:
+            return cls._rule_stats.setdefault(cls_instance, {}).setdefault(rule_id, RuleStats())
+
+    @classmethod
+    def enable_profiling(cls):
+        """
+        Records call count, failure count, total and maximum wall time of every instance rule and action, per class
+        being instantiated (or guarded) and rule identity. The instrumentation is part of the instance plans, which
+        get rebuilt, so there is no cost at all once profiling is disabled again.
+        """
+        with cls._lock:
+            cls._profiling = True
+            cls._invalidate_all_instance_plans()
+
+    @classmethod
+    def disable_profiling(cls):
+        with cls._lock:
+            cls._profiling = False
+            cls._invalidate_all_instance_plans()
+
+    @classmethod
+    def reset_profiling(cls):
+        with cls._lock:
+            cls._rule_stats = weakref.WeakKeyDictionary()
+            if cls._profiling:
+                cls._invalidate_all_instance_plans()
+
+    @classmethod
+    def profiling_snapshot(cls) -> dict:
+        """
+        Returns {class: {rule identity: {'calls', 'failures', 'skipped', 'total_time', 'max_time'}}}, a copy of the
+        statistics gathered since profiling was enabled (or reset)
+        """
+        return {cls_instance: {rule_id: stats.as_dict() for rule_id, stats in rule_stats.items()}
+                for cls_instance, rule_stats in list(cls._rule_stats.items())}
+
+    @classmethod
+    def _invalidate_all_instance_plans(cls):
+        # only classes with instance functions (or deriving from one) can have a plan that is not empty
+        for cls_instance in list(cls._functions_applied_to_instance.keys()):
+            cls.invalidate_instance_plans(cls_instance)
+
+    @classmethod
+    def invalidate_instance_plans(cls, cls_instance: type):
+        """
+        Drops the cached InstancePlan of a class and of all classes deriving from it, they will be rebuilt on next use
+        """
+        with cls._lock:
+            pending = [cls_instance]
+            while pending:
+                klass = pending.pop()
+                if klass.__dict__.get(_PLAN_ATTRIBUTE) is not None:
+                    setattr(klass, _PLAN_ATTRIBUTE, None)
+                pending.extend(type.__subclasses__(klass))
+
+    @classmethod
+    def is_disabled(cls, cls_instance: type = None) -> bool:
+        """
+        Whether the instance checks are disabled globally or, if given, for the class (through any of its bases)
+        """
+        if cls._disabled_globally:
+            return True
+        return cls_instance is not None and any(klass in cls._disabled_classes for klass in cls_instance.__mro__)
+
+    @classmethod
+    def _affected_classes(cls, cls_instance: type = None) -> list:
+        # the class and everything deriving from it, or every class with instance functions or guarded methods
+        if cls_instance is None:
+            roots = set(cls._functions_applied_to_instance.keys()) | set(cls._guarded_attributes.keys())
+            roots.update(cls._classes_with_guarded_methods)
+        else:
+            roots = {cls_instance}
+        affected = set()
+        pending = list(roots)
+        while pending:
+            klass = pending.pop()
+            if klass not in affected:
+                affected.add(klass)
+                pending.extend(type.__subclasses__(klass))
+        return list(affected)
+
+    @classmethod
+    def _unguard(cls, cls_instance: type):
+        guarded = {name: attribute for name, attribute in vars(cls_instance).items() if _guarded(attribute)}
+        for name, attribute in guarded.items():
+            setattr(cls_instance, name, _unguarded(attribute))
+        if guarded:
+            cls._guarded_attributes.setdefault(cls_instance, {}).update(guarded)
+
+    @classmethod
+    def add_field_rule(cls, cls_instance: type, name: str, check, on_failure):
+        """
+        Installs (or extends) the data descriptor on cls_instance running check on every value assigned to the field
+        name, on_failure is called when it returns False (see fields.FieldRule). Classes deriving from cls_instance get
+        it again when they redefine the field.
+        """
+        with cls._lock:
+            setattr(cls_instance, name, field_rule_for(cls_instance, name, check, on_failure))
+            cls._field_rule_names.add(name)
+            if cls.is_disabled(cls_instance):
+                cls._unguard(cls_instance)
+
+    @classmethod
+    def _reguard(cls, cls_instance: type):
+        for name, attribute in cls._guarded_attributes.pop(cls_instance, {}).items():
+            setattr(cls_instance, name, attribute)
+
+    @classmethod
+    def disable(cls, cls_instance: type = None):
+        """
+        Disables the instance checks of a class and of the classes deriving from it, or of all classes if none is
+        given, without removing any decorator. The guarded methods (run_instance_rules and the like) are swapped for
+        the original, undecorated methods and instantiation no longer runs rules or actions. Disabled globally, the
+        metaclass no longer takes part in instantiation at all, making it as cheap as for a plain class.
+        Class checks keep running when classes are defined: disabling globally first runs the class checks deferred by
+        verify_on_first_use, which from then on run right away. Setting the environment variable
+        DECORULES_DISABLE_INSTANCE_CHECKS disables all instance checks from the start.
+        """
+        with cls._lock:
+            if cls_instance is None:
+                # the class checks deferred by verify_on_first_use would otherwise never run
+                cls.verify_all()
+                cls._disabled_globally = True
+                if '__call__' in vars(HasRulesActions):
+                    cls._metaclass_call = HasRulesActions.__call__
+                    del HasRulesActions.__call__
+            else:
+                cls._disabled_classes.add(cls_instance)
+            for klass in cls._affected_classes(cls_instance):
+                cls._unguard(klass)
+                if klass.__dict__.get(_PLAN_ATTRIBUTE) is not None:
+                    setattr(klass, _PLAN_ATTRIBUTE, None)
+
+    @classmethod
+    def enable(cls, cls_instance: type = None):
+        """
+        Reverts disable for a class (and the classes deriving from it) or, if none is given, the global disable.
+        Classes disabled individually stay disabled after a global enable.
+        """
+        with cls._lock:
+            if cls_instance is None:
+                cls._disabled_globally = False
+                if '__call__' not in vars(HasRulesActions):
+                    HasRulesActions.__call__ = cls._metaclass_call
+            else:
+                cls._disabled_classes.discard(cls_instance)
+            for klass in cls._affected_classes(cls_instance):
+                if not cls.is_disabled(klass):
+                    cls._reguard(klass)
+                if klass.__dict__.get(_PLAN_ATTRIBUTE) is not None:
+                    setattr(klass, _PLAN_ATTRIBUTE, None)
+
     @classmethod
     def run_functions_applied_to_instance(cls, instance, purpose=Purpose.RULE):
         if not issubclass(type(type(instance)), HasRulesActions):
             raise TypeError(
                 f"Attempt to check functions_applied_to_instance applied on an instance of {type(instance)}, "
                 f"which is not of HasRulesActions type")
-        # for the instance functions we must loop through all the bases
-        if len(cls._functions_applied_to_instance) > 0:
-            cls_keys = [type(instance).__name__]
-            bases = [x.__name__ for x in get_all_base_classes(type(instance)) if issubclass(type(x), HasRulesActions)]
-            if bases:
-                cls_keys.extend(bases)
-            for cls_key in cls_keys:
-                cls._apply_functions_applied_to_instance(instance, cls_key, purpose)
+        deferral = _deferred_checks.get()
+        if deferral is not None and deferral.defer(instance, (purpose,)):
+            return
+        # the plan already holds the functions of all the bases
+        for func in cls.get_instance_plan(type(instance)).functions(purpose):
+            func(instance)
 
     @classmethod
-    def get_functions_applied_instance(cls, class_name: str):
-        return cls._functions_applied_to_instance[class_name]
+    def run_rules_and_actions_applied_to_instance(cls, instance):
+        """
+        Runs all the instance rules and then all the instance actions in a single pass over the plan of the class
+        """
+        if not issubclass(type(type(instance)), HasRulesActions):
+            raise TypeError(
+                f"Attempt to check functions_applied_to_instance applied on an instance of {type(instance)}, "
+                f"which is not of HasRulesActions type")
+        deferral = _deferred_checks.get()
+        if deferral is not None and deferral.defer(instance, (Purpose.RULE, Purpose.ACTION)):
+            return
+        for func in cls.get_instance_plan(type(instance)).rules_and_actions:
+            func(instance)
 
     @classmethod
-    def get_functions_applied_class(cls, class_name: str):
-        return cls._functions_applied_to_class[class_name]
+    async def arun_functions_applied_to_instance(cls, instance, purpose=Purpose.RULE):
+        """
+        Runs the instance functions of the given purpose including the async ones: first the others, then the async
+        rules one after the other or the async actions concurrently (through asyncio.gather). Checks are not deferred.
+        """
+        if not issubclass(type(type(instance)), HasRulesActions):
+            raise TypeError(
+                f"Attempt to check functions_applied_to_instance applied on an instance of {type(instance)}, "
+                f"which is not of HasRulesActions type")
+        plan = cls.get_instance_plan(type(instance))
+        for func in plan.functions(purpose):
+            func(instance)
+        if purpose == Purpose.RULE:
+            for func in plan.async_rules:
+                await func(instance)
+        elif plan.async_actions:
+            # imported here, asyncio adds noticeably to the import time of decorules
+            import asyncio
+            await asyncio.gather(*(func(instance) for func in plan.async_actions))
+
+    @classmethod
+    async def acreate(cls, cls_instance: type, *args, **kwargs):
+        """
+        Creates an instance of a HasRulesActions class the way instantiation does, awaiting its async instance rules
+        and actions as well (see arun_rules_and_actions_applied_to_instance). Classes with async instance functions can
+        only be instantiated through it.
+        """
+        if not EnforcedFunctions.get_instance_plan(cls_instance).is_async:
+            return cls_instance(*args, **kwargs)
+        token = _created_by_acreate.set(cls_instance)
+        try:
+            instance = cls_instance(*args, **kwargs)
+        finally:
+            _created_by_acreate.reset(token)
+        await cls.arun_rules_and_actions_applied_to_instance(instance)
+        return instance
+
+    @classmethod
+    async def arun_rules_and_actions_applied_to_instance(cls, instance):
+        """
+        Runs all the instance rules and then all the instance actions, including the async ones
+        """
+        await cls.arun_functions_applied_to_instance(instance, Purpose.RULE)
+        await cls.arun_functions_applied_to_instance(instance, Purpose.ACTION)
+
+    @classmethod
+    @contextmanager
+    def deferred(cls, *instances):
+        """
+        Context manager suspending the instance checks of guarded methods (run_instance_rules, run_instance_actions
+        and the like) for the given instances, or for all instances if none are given. On leaving the context the
+        rules and then the actions of every instance that was guarded inside it run once, and all failures are raised
+        together as a DeferredRulesError. Instantiation is not deferred. If the context is left through an exception,
+        the deferred checks are dropped.
+        """
+        deferral = _DeferredChecks(instances, _deferred_checks.get())
+        token = _deferred_checks.set(deferral)
+        try:
+            yield deferral
+        finally:
+            _deferred_checks.reset(token)
+        failures = []
+        for instance, purposes in deferral.pending.values():
+            plan = cls.get_instance_plan(type(instance))
+            instance_failed = False
+            for purpose in (Purpose.RULE, Purpose.ACTION):
+                if purpose not in purposes or instance_failed:
+                    continue
+                for func in plan.functions(purpose):
+                    try:
+                        func(instance)
+                    except Exception as ex:
+                        failures.append((instance, ex))
+                        instance_failed = True
+        if failures:
+            raise DeferredRulesError(failures)
+
+    @classmethod
+    @contextmanager
+    def tracking_changes(cls, instance, touched=frozenset()):
+        """
+        Context manager yielding a set that holds, once the context is left, touched and the names of the attributes
+        of the instance (in its __dict__ or its slots) that were set to another object or deleted within the context.
+        The attributes are compared to a copy taken on entering, so nothing is recorded outside the context and
+        attribute assignment stays as cheap as without decorules.
+        """
+        changed = set(touched)
+        before = _attribute_state(instance)
+        try:
+            yield changed
+        finally:
+            after = _attribute_state(instance)
+            changed.update(name for name, value in after.items() if before.get(name, _ABSENT) is not value)
+            changed.update(name for name in before if name not in after)
+
+    @classmethod
+    def run_changed_functions_applied_to_instance(cls, instance, changed, purpose=Purpose.RULE):
+        """
+        Runs the instance functions of the given purpose that read any of the changed attributes (or that did not
+        declare what they read)
+        """
+        if not issubclass(type(type(instance)), HasRulesActions):
+            raise TypeError(
+                f"Attempt to check functions_applied_to_instance applied on an instance of {type(instance)}, "
+                f"which is not of HasRulesActions type")
+        deferral = _deferred_checks.get()
+        if deferral is not None and deferral.defer(instance, (purpose,)):
+            return
+        for func in cls.get_instance_plan(type(instance)).functions_reading(changed, purpose):
+            func(instance)
+
+    @classmethod
+    def validate_many(cls, instances, purpose: Purpose = Purpose.RULE, executor=None,
+                      chunk_size: int = 1000) -> ValidationReport:
+        """
+        Validates a collection of instances against their instance rules (or the predicates of their actions, which
+        are not executed) and reports every failure instead of raising on the first one. The plan of every class is
+        resolved once for the whole batch. Predicates marked with utils.batched_predicate receive all instances of a
+        class at once. Async predicates are awaited one after the other, which validate_many cannot do within a running
+        event loop (it raises a TypeError there). A predicate that raises counts as a failure, a batched predicate that
+        raises as a failure of every instance in the batch. A batched predicate returning a number of outcomes that
+        differs from the number of instances raises a ValueError.
+
+        :param instances: an iterable of instances of HasRulesActions classes
+        :param purpose: Purpose.RULE checks the rules, Purpose.ACTION checks the conditions of the actions
+        :param executor: a concurrent.futures.Executor (e.g. a ProcessPoolExecutor) validating chunks of at most
+        chunk_size instances of a class in parallel. For a process pool the instances are pickled and the classes
+        (and with them their rules) are imported by name in the workers, so they must be defined at module level.
+        Batched predicates then receive a chunk at a time.
+        :return: a ValidationReport with the indices (in the iteration order of instances) of the failures
+        """
+        instances = list(instances)
+        indices_per_class = {}
+        for index, instance in enumerate(instances):
+            indices_per_class.setdefault(type(instance), []).append(index)
+
+        report = ValidationReport(len(instances))
+        chunks = []
+        for cls_instance, indices in indices_per_class.items():
+            if not issubclass(type(cls_instance), HasRulesActions):
+                raise TypeError(
+                    f"Attempt to validate an instance of {cls_instance}, which is not of HasRulesActions type")
+            if executor is None:
+                members = [instances[index] for index in indices]
+                for position, rule_id in cls._class_failures(cls_instance, members, purpose):
+                    report.failures.append((indices[position], rule_id))
+                continue
+            for start in range(0, len(indices), chunk_size):
+                chunk_indices = indices[start:start + chunk_size]
+                members = [instances[index] for index in chunk_indices]
+                chunks.append((chunk_indices, executor.submit(_validate_chunk, cls_instance, members, purpose)))
+        for chunk_indices, future in chunks:
+            for position, rule_id in future.result():
+                report.failures.append((chunk_indices[position], rule_id))
+        report.failures.sort()
+        return report
+
+    @classmethod
+    def _class_failures(cls, cls_instance: type, members: list, purpose: Purpose) -> list:
+        """
+        The (position in members, rule identity) pairs of the failures of instances of one class
+        """
+        failures = []
+        plan = cls.get_instance_plan(cls_instance)
+        async_functions = plan.async_rules if purpose == Purpose.RULE else plan.async_actions
+        for plan_func in plan.functions(purpose) + async_functions:
+            # compiled functions are reported per rule they were compiled from
+            for func in _registered_functions(plan_func):
+                rule_id = getattr(func, 'rule_id', repr(func))
+                failures.extend((position, rule_id) for position in cls._failed_positions(func, members))
+        return failures
+
+    @staticmethod
+    def _failed_positions(func, members: list) -> list:
+        predicate = getattr(func, '__wrapped__', None)
+        if predicate is None:
+            # not registered through a decorator, all we can do is see whether it raises
+            checker = false_on_raise_else_true(func)
+            return [position for position, member in enumerate(members) if not checker(member)]
+        if getattr(func, 'is_async', False):
+            # imported here, asyncio adds noticeably to the import time of decorules
+            import asyncio
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return asyncio.run(_async_failed_positions(predicate, members))
+            raise TypeError(f"validate_many cannot await the async predicate {getattr(func, 'rule_id', repr(func))} "
+                            f"inside a running event loop, run it in another thread (e.g. with asyncio.to_thread)")
+        batch = getattr(predicate, 'batch', None)
+        if batch is not None:
+            try:
+                outcomes = batch(members)
+            except Exception:
+                # the batch tells nothing about any single instance
+                return list(range(len(members)))
+            if len(outcomes) != len(members):
+                raise ValueError(f"the batched predicate of {getattr(func, 'rule_id', repr(func))} returned "
+                                 f"{len(outcomes)} outcomes for {len(members)} instances")
+            return [position for position, passed in enumerate(outcomes) if not passed]
+        failed = []
+        for position, member in enumerate(members):
+            try:
+                outcome = predicate(member)
+            except Exception:
+                outcome = False
+            if outcome is False:
+                failed.append(position)
+        return failed
+
+    @classmethod
+    def get_functions_applied_instance(cls, cls_instance) -> PurposeRegistry:
+        """
+        The instance functions registered on a class, given as the class or its name (the functions of all classes of
+        that name)
+        """
+        return cls._registry_of(cls._functions_applied_to_instance, cls_instance)
+
+    @classmethod
+    def get_functions_applied_class(cls, cls_instance) -> PurposeRegistry:
+        """
+        The class functions registered on a class, given as the class or its name (the functions of all classes of that
+        name)
+        """
+        return cls._registry_of(cls._functions_applied_to_class, cls_instance)
+
+    @classmethod
+    def _registry_of(cls, registries, cls_instance) -> PurposeRegistry:
+        if not isinstance(cls_instance, str):
+            return registries.get(cls_instance, PurposeRegistry())
+        with cls._lock:
+            named = [registry for key, registry in registries.items() if key.__name__ == cls_instance]
+        combined = PurposeRegistry()
+        for registry in named:
+            for func, purpose in registry:
+                combined = combined.with_function(func, purpose)
+        return combined
 
     @classmethod
     def revert_to_boolean_returns(cls, class_names=None):
         """
-        Returns a tuple which for the supplied class names (defaults to all class names) with the first element:
-        a dictionary with the class names as keys and as values the list of functions checking class structure
+        Returns a tuple which for the supplied class names (defaults to all classes) with the first element:
+        a dictionary with the classes as keys and as values the list of functions checking class structure
         but returning True if the check passed and False if the original check function had thrown an
         exception with the second element: a dictionary with the class names as keys and as values the list of
         functions checking a class instance but returning True if the check passed and False if the original check
         function had thrown an exception This is not used yet, but could be part of run-time transfer of
         rules between classes.
 
-        :param class_names: The class names that are the keys of the original dictionary. Note that if an entire
-        class hierarchy is required all base classes (that could have enforced rules) needs to be supplied :type
-        class_names: a container type that allows the use of 'in', i.e. overloads __contains__
+        :param class_names: The classes (or their names) that are the keys of the original dictionary. Note that if an
+        entire class hierarchy is required all base classes (that could have enforced rules) needs to be supplied
+        :type class_names: a container type that allows the use of 'in', i.e. overloads __contains__
         """
-        if class_names is None:
-            class_names = set(list(cls._functions_applied_to_class.keys()) + list(
-                cls._functions_applied_to_instance.keys()))
 
+        def is_selected(key: type) -> bool:
+            return class_names is None or key in class_names or key.__name__ in class_names
+
+        with cls._lock:
+            # iterating while another thread registers a class would fail
+            class_registries = list(cls._functions_applied_to_class.items())
+            instance_registries = list(cls._functions_applied_to_instance.items())
         return (
-            {key: [false_on_raise_else_true(func) for func, func_purpose in cls._functions_applied_to_class[key] if
-                   func_purpose == Purpose.RULE] for key, _ in
-             cls._functions_applied_to_class.items() if key in class_names},
-            {key: [false_on_raise_else_true(func) for func, func_purpose in cls._functions_applied_to_instance[key] if
-                   func_purpose == Purpose.RULE] for key, _ in
-             cls._functions_applied_to_instance.items() if key in class_names}
+            {key: [false_on_raise_else_true(func) for func in registry.functions(Purpose.RULE)]
+             for key, registry in class_registries if is_selected(key)},
+            {key: [false_on_raise_else_true(func) for func in registry.functions(Purpose.RULE)]
+             for key, registry in instance_registries if is_selected(key)}
         )
+
+
+async def _async_failed_positions(predicate, members: list) -> list:
+    # one after the other, as the async rules run on an instance
+    failed = []
+    for position, member in enumerate(members):
+        try:
+            outcome = predicate(member)
+            if inspect.isawaitable(outcome):
+                outcome = await outcome
+        except Exception:
+            outcome = False
+        if outcome is False:
+            failed.append(position)
+    return failed
+
+
+def _validate_chunk(cls_instance: type, members: list, purpose: Purpose) -> list:
+    # module level so that it can be sent to the workers of a process pool
+    return EnforcedFunctions._class_failures(cls_instance, members, purpose)
+
+
+if os.environ.get(DISABLE_ENVIRONMENT_VARIABLE, '0') not in ('', '0'):
+    EnforcedFunctions.disable()
+if os.environ.get(VERIFY_ON_FIRST_USE_ENVIRONMENT_VARIABLE, '0') not in ('', '0'):
+    EnforcedFunctions.verify_on_first_use()
+if os.environ.get(CLASS_CHECK_CACHE_ENVIRONMENT_VARIABLE, '0') not in ('', '0'):
+    # imported here, sqlite3 is only needed with a cache
+    from decorules.cache import ClassCheckCache
+    _cache_path = os.environ[CLASS_CHECK_CACHE_ENVIRONMENT_VARIABLE]
+    EnforcedFunctions.use_class_check_cache(ClassCheckCache(None if _cache_path == '1' else _cache_path))
@@ -0,0 +1,98 @@
+import threading
+import weakref
+from collections import OrderedDict
+
+# memoization of the outcome of instance rules, for instances whose checked state cannot change unnoticed: instances
+# that are hashable by value (e.g. frozen dataclasses) or that keep a version counter they increase on every change.
+# anything else is simply checked every time.
+
+
+class Memoization:
+    """
+    Bounded (least recently used) cache of the outcomes of one predicate. An instance with a version attribute that is
+    not None is keyed by its identity and version. Otherwise an instance of a class defining __hash__ is keyed by
+    weak references to its class and itself, which compare like the instance while it lives, i.e. equal instances share
+    an outcome. Entries never keep an instance or its class alive, they are dropped when the instance they were stored
+    for is garbage collected (an instance without weak references is not cached). Only outcomes are cached, a predicate
+    that raises is called again next time.
+    """
+
+    def __init__(self, maxsize: int = 1024, version_attribute: str = 'version'):
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be at least 1, not {maxsize}")
+        self.maxsize = maxsize
+        self.version_attribute = version_attribute
+        self.hits = 0
+        self.misses = 0
+        # key -> (outcome, id of the instance it was stored for)
+        self._outcomes = OrderedDict()
+        # id of an instance -> its keys in _outcomes
+        self._keys_by_id = {}
+        self._lock = threading.Lock()
+
+    def _key(self, instance):
+        version = getattr(instance, self.version_attribute, None) if self.version_attribute else None
+        if version is not None:
+            return id(instance), version
+        if type(instance).__hash__ in (None, object.__hash__):
+            return None
+        try:
+            hash(instance)
+            return weakref.ref(type(instance)), weakref.ref(instance)
+        except TypeError:
+            # e.g. a frozen dataclass holding a list, or slots without __weakref__
+            return None
+
+    def _forget(self, instance_id: int):
+        with self._lock:
+            for key in self._keys_by_id.pop(instance_id, ()):
+                self._outcomes.pop(key, None)
+
+    def _store(self, instance, key, outcome):
+        instance_id = id(instance)
+        with self._lock:
+            if key not in self._outcomes:
+                keys = self._keys_by_id.get(instance_id)
+                if keys is None:
+                    try:
+                        weakref.finalize(instance, self._forget, instance_id)
+                    except TypeError:
+                        # no weak references to it, its id could be reused by another instance
+                        return
+                    keys = self._keys_by_id[instance_id] = set()
+                keys.add(key)
+            self._outcomes[key] = (outcome, instance_id)
+            self._outcomes.move_to_end(key)
+            while len(self._outcomes) > self.maxsize:
+                evicted, (_, evicted_id) = self._outcomes.popitem(last=False)
+                self._keys_by_id.get(evicted_id, set()).discard(evicted)
+
+    def memoized(self, predicate):
+        """
+        Returns a function calling predicate only for instances whose outcome is not cached
+        """
+
+        def memoized_predicate(instance):
+            key = self._key(instance)
+            if key is None:
+                return predicate(instance)
+            with self._lock:
+                stored = self._outcomes.get(key)
+                if stored is not None:
+                    self._outcomes.move_to_end(key)
+                    self.hits += 1
+                    return stored[0]
+                self.misses += 1
+            outcome = predicate(instance)
+            self._store(instance, key, outcome)
+            return outcome
+
+        return memoized_predicate
+
+    def clear(self):
+        with self._lock:
+            self._outcomes.clear()
+            self._keys_by_id.clear()
+
+    def __len__(self):
+        return len(self._outcomes)
@@ -0,0 +1,182 @@
+import random
+from time import perf_counter
+
+# enforcement policies trade coverage of the instance checks for throughput: a policy decides for every check whether
+# it runs. they are set per class or per rule through EnforcedFunctions.set_policy (or the policy argument of the
+# decorators) and can be swapped at runtime. every policy counts the checks it let through (calls) and skipped.
+
+
+class EnforcementPolicy:
+    """
+    Base class of the policies, runs every check
+    """
+    # timed policies get told how long every check they let through took, as measured by their clock
+    timed = False
+    clock = staticmethod(perf_counter)
+
+    def __init__(self):
+        self.calls = 0
+        self.skipped = 0
+
+    def _decide(self) -> bool:
+        return True
+
+    def allows(self) -> bool:
+        if self._decide():
+            self.calls += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def record(self, elapsed: float):
+        pass
+
+
+class Always(EnforcementPolicy):
+    pass
+
+
+class EveryNth(EnforcementPolicy):
+    """
+    Runs the first check and then every n-th one
+    """
+
+    def __init__(self, n: int):
+        if n < 1:
+            raise ValueError(f"n must be at least 1, not {n}")
+        super().__init__()
+        self.n = n
+        self._count = 0
+
+    def _decide(self) -> bool:
+        run = self._count % self.n == 0
+        self._count += 1
+        return run
+
+
+class Sampled(EnforcementPolicy):
+    """
+    Runs a check with the given probability
+    """
+
+    def __init__(self, probability: float, random_function=random.random):
+        if not 0.0 <= probability <= 1.0:
+            raise ValueError(f"probability must be between 0 and 1, not {probability}")
+        super().__init__()
+        self.probability = probability
+        self._random = random_function
+
+    def _decide(self) -> bool:
+        return self._random() < self.probability
+
+
+class TimeBudget(EnforcementPolicy):
+    """
+    Runs checks as long as less than max_microseconds were spent on them in the current second
+    """
+    timed = True
+
+    def __init__(self, max_microseconds: float, clock=perf_counter):
+        super().__init__()
+        self.max_microseconds = max_microseconds
+        self.clock = clock
+        self._window_start = clock()
+        self._spent = 0.0
+
+    def _decide(self) -> bool:
+        now = self.clock()
+        if now - self._window_start >= 1.0:
+            self._window_start = now
+            self._spent = 0.0
+        return self._spent * 1e6 < self.max_microseconds
+
+    def record(self, elapsed: float):
+        self._spent += elapsed
+
+
+def run_with_policy(policy: EnforcementPolicy, func, *args):
+    """
+    Calls func(*args) if the policy allows it, returns None otherwise
+    """
+    if not policy.allows():
+        return None
+    if policy.timed:
+        start = policy.clock()
+        try:
+            return func(*args)
+        finally:
+            policy.record(policy.clock() - start)
+    return func(*args)
+
+
+async def arun_with_policy(policy: EnforcementPolicy, coroutine_function, *args):
+    """
+    Awaits coroutine_function(*args) if the policy allows it, returns None otherwise
+    """
+    if not policy.allows():
+        return None
+    if policy.timed:
+        start = policy.clock()
+        try:
+            return await coroutine_function(*args)
+        finally:
+            policy.record(policy.clock() - start)
+    return await coroutine_function(*args)
+
+
+def gated(func, policy: EnforcementPolicy, stats=None):
+    """
+    Wraps a function of an instance plan so that it only runs when the policy allows it. Skipped calls are counted
+    in stats (a profiling.RuleStats) when given.
+    """
+
+    def gated_func(instance):
+        if not policy.allows():
+            if stats is not None:
+                stats.skipped += 1
+            return None
+        if policy.timed:
+            start = policy.clock()
+            try:
+                return func(instance)
+            finally:
+                policy.record(policy.clock() - start)
+        return func(instance)
+
+    gated_func.plan_wrapped = func
+    gated_func.rule_id = getattr(func, 'rule_id', repr(func))
+    gated_func.purpose = getattr(func, 'purpose', None)
+    gated_func.reads = getattr(func, 'reads', None)
+    return gated_func
+
+
+def gated_group(functions: tuple, policy: EnforcementPolicy, stats: tuple = None):
+    """
+    Combines functions of an instance plan into one that runs all of them (in order) or, when the policy does not
+    allow it, none of them
+    """
+
+    def run_group(instance):
+        for func in functions:
+            func(instance)
+
+    def gated_group_func(instance):
+        if not policy.allows():
+            if stats is not None:
+                for rule_stats in stats:
+                    rule_stats.skipped += 1
+            return None
+        if policy.timed:
+            start = policy.clock()
+            try:
+                return run_group(instance)
+            finally:
+                policy.record(policy.clock() - start)
+        return run_group(instance)
+
+    gated_group_func.plan_group = functions
+    gated_group_func.purpose = getattr(functions[0], 'purpose', None) if functions else None
+    gated_group_func.rule_id = f"group({', '.join(getattr(func, 'rule_id', repr(func)) for func in functions)})"
+    all_reads = [getattr(func, 'reads', None) for func in functions]
+    gated_group_func.reads = None if any(reads is None for reads in all_reads) else frozenset().union(*all_reads)
+    return gated_group_func
@@ -40,6 +40,10 @@ def min_list_type_counter(instance_or_type,
     if member_object is None:
         return False
     else:
+        type_counter = getattr(member_object, 'type_counter', None)
+        if type_counter is not None:
+            # kept up to date by aggregates.TrackedList, no need to go through the elements
+            return type_counter >= min_counter
         if isinstance(member_object, Iterable):
             return Counter(type(x) for x in member_object) >= min_counter
         else:
@@ -0,0 +1,52 @@
+from time import perf_counter
+
+# per rule instrumentation used by EnforcedFunctions when profiling is enabled. the wrappers below are only put into
+# the instance plans while profiling is on, the rules themselves are never instrumented.
+
+
+class RuleStats:
+    """
+    Call count, failure count (a raised exception or a false predicate) and wall time in seconds of one rule or
+    action of one class. skipped counts the checks an enforcement policy decided not to run.
+    """
+    __slots__ = ('calls', 'failures', 'skipped', 'total_time', 'max_time')
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.skipped = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed: float, failed: bool):
+        self.calls += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        if failed:
+            self.failures += 1
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def profiled(func, stats: RuleStats):
+    """
+    Wraps a function of an instance plan so that every call is recorded in stats
+    """
+
+    def profiled_func(instance):
+        start = perf_counter()
+        try:
+            outcome = func(instance)
+        except BaseException:
+            stats.record(perf_counter() - start, True)
+            raise
+        stats.record(perf_counter() - start, outcome is False)
+        return outcome
+
+    profiled_func.plan_wrapped = func
+    profiled_func.rule_id = getattr(func, 'rule_id', repr(func))
+    profiled_func.purpose = getattr(func, 'purpose', None)
+    profiled_func.reads = getattr(func, 'reads', None)
+    return profiled_func
@@ -1,5 +1,7 @@
+import inspect
 from functools import wraps, partial
 from enum import Enum
+from dataclasses import dataclass, field
 import operator
 
 class Purpose(Enum):
@@ -7,6 +9,29 @@ class Purpose(Enum):
     ACTION = 2
 
 
+def _key_type_comparison_enforcer(instance_or_type,
+                                  enforced_type: type,
+                                  enforced_key: str,
+                                  comparison_value=None,
+                                  operator_used=operator.eq,
+                                  attrs_used=None):
+    member_object = getattr(instance_or_type, enforced_key, None)
+    if member_object is None:
+        if attrs_used is not None:
+            member_object = attrs_used.get(enforced_key, None)
+    if member_object is None:
+        return False
+    else:
+        if issubclass(type(member_object), enforced_type):
+            if comparison_value is not None and operator_used is not None:
+                return operator_used(member_object, comparison_value)
+            else:
+                return True
+        else:
+            return False
+    pass
+
+
 def member_enforcer(enforced_key: str,
                     enforced_type: type,
                     comparison_value=None,
@@ -26,29 +51,7 @@ def member_enforcer(enforced_key: str,
     :return: bool
     """
 
-    def key_type_comparison_enforcer(instance_or_type,
-                                     enforced_type: type,
-                                     enforced_key: str,
-                                     comparison_value=comparison_value,
-                                     operator_used=operator_used,
-                                     attrs_used=attrs_used):
-        member_object = getattr(instance_or_type, enforced_key, None)
-        if member_object is None:
-            if attrs_used is not None:
-                member_object = attrs_used.get(enforced_key, None)
-        if member_object is None:
-            return False
-        else:
-            if issubclass(type(member_object), enforced_type):
-                if comparison_value is not None and operator_used is not None:
-                    return operator_used(member_object, comparison_value)
-                else:
-                    return True
-            else:
-                return False
-        pass
-
-    return partial(key_type_comparison_enforcer,
+    return partial(_key_type_comparison_enforcer,
                    enforced_type=enforced_type,
                    enforced_key=enforced_key,
                    comparison_value=comparison_value,
@@ -56,6 +59,31 @@ def member_enforcer(enforced_key: str,
                    attrs_used=attrs_used)
 
 
+def member_enforcer_arguments(func):
+    """
+    Returns the arguments (enforced_key, enforced_type, comparison_value, operator_used and attrs_used) bound in a
+    function created by member_enforcer, or None if func was not created by member_enforcer
+    """
+    if isinstance(func, partial) and func.func is _key_type_comparison_enforcer and not func.args:
+        return func.keywords
+    return None
+
+
+def attrs_parameter(func):
+    """
+    The name of the keyword argument through which a class check takes the attributes of the class being defined:
+    'attrs' (as in key_type_enforcer), 'attrs_used' for a member_enforcer without fallback attributes, or None
+    """
+    member_arguments = member_enforcer_arguments(func)
+    if member_arguments is not None:
+        return 'attrs_used' if member_arguments['attrs_used'] is None else None
+    try:
+        parameters = inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return None
+    return 'attrs' if 'attrs' in parameters else None
+
+
 def false_on_raise_else_true(func):
     # will be used when we 'transfer' enforced rules
     @wraps(func)
@@ -67,3 +95,65 @@ def false_on_raise_else_true(func):
             return False
 
     return func_wrapper
+
+
+def rule_identity(func) -> str:
+    """
+    A name for an enforced function that is stable between runs and processes (unlike the repr of a function,
+    which contains its address): the module and qualified name, with the arguments bound by a partial and the line
+    number for lambdas.
+    """
+    if isinstance(func, partial):
+        arguments = [repr(x) for x in func.args] + [f"{key}={value!r}" for key, value in func.keywords.items()]
+        return f"{rule_identity(func.func)}({', '.join(arguments)})"
+    module = getattr(func, '__module__', None)
+    qualname = getattr(func, '__qualname__', None)
+    if module is None or qualname is None:
+        return repr(func)
+    identity = f"{module}.{qualname}"
+    code = getattr(func, '__code__', None)
+    if '<lambda>' in qualname and code is not None:
+        identity += f":{code.co_firstlineno}"
+    return identity
+
+
+def batched_predicate(predicate, batch_predicate):
+    """
+    Marks a predicate as having a batched counterpart that is used by EnforcedFunctions.validate_many.
+
+    :param predicate: the usual predicate taking a single instance, used at instantiation and in guarded methods
+    :param batch_predicate: takes a sequence of instances and returns a sequence of booleans (or a boolean mask) of
+    the same length, True where the instance passes
+    :return: the predicate, carrying batch_predicate as its 'batch' attribute
+    """
+    try:
+        predicate.batch = batch_predicate
+    except AttributeError:
+        # e.g. builtins do not accept attributes
+        predicate = wraps(predicate)(partial(predicate))
+        predicate.batch = batch_predicate
+    return predicate
+
+
+@dataclass
+class ValidationReport:
+    """
+    Outcome of a batch validation: the number of validated instances and a sorted list of
+    (instance index, rule identity) pairs, one for every rule an instance failed.
+    """
+    count: int = 0
+    failures: list = field(default_factory=list)
+
+    @property
+    def passed(self) -> bool:
+        return not self.failures
+
+    @property
+    def failed_indices(self) -> list:
+        return sorted({index for index, _ in self.failures})
+
+    def by_rule(self) -> dict:
+        failures_by_rule = {}
+        for index, rule_id in self.failures:
+            failures_by_rule.setdefault(rule_id, []).append(index)
+        return failures_by_rule
@@ -0,0 +1,142 @@
+import operator
+from functools import partial
+import numpy as np
+from decorules.predicates import key_type_enforcer, min_value
+from decorules.utils import member_enforcer, batched_predicate
+
+# array-aware versions of the member checks, used for batch validation (EnforcedFunctions.validate_many).
+# they accept either a sequence of instances (the attribute gets pulled from every instance) or a ready numpy array
+# holding the attribute values, and return a boolean mask with True where the check passes. requires numpy.
+
+# the dtypes of a ready array standing for a python type, as in python bool values are int values too
+_NUMPY_KINDS = {
+    bool: (np.bool_,),
+    int: (np.integer, np.bool_),
+    float: (np.floating,),
+    complex: (np.complexfloating,),
+    str: (np.str_,),
+}
+
+_UFUNCS = {
+    operator.eq: np.equal,
+    operator.ne: np.not_equal,
+    operator.lt: np.less,
+    operator.le: np.less_equal,
+    operator.gt: np.greater,
+    operator.ge: np.greater_equal,
+}
+
+
+def _present_values(instances_or_array, enforced_key: str):
+    """
+    Returns a mask of the instances that have the attribute (not None), a 1-d array with the values present and the
+    python types of these values (None for a ready array, whose dtype stands for the types)
+    """
+    if isinstance(instances_or_array, np.ndarray):
+        return np.ones(len(instances_or_array), dtype=bool), instances_or_array, None
+    values = [getattr(x, enforced_key, None) for x in instances_or_array]
+    present = np.fromiter((x is not None for x in values), dtype=bool, count=len(values))
+    present_values = [x for x in values if x is not None]
+    # taken before numpy converts the values, e.g. bool into np.bool_ or np.int64 into a plain int64 dtype
+    value_types = [type(x) for x in present_values]
+    column = None
+    if len(set(value_types)) == 1:
+        # a single type lets numpy pick a proper dtype without converting values into one another
+        column = np.asarray(present_values)
+    if column is None or column.ndim != 1:
+        column = np.empty(len(present_values), dtype=object)
+        for position, value in enumerate(present_values):
+            column[position] = value
+    return present, column, value_types
+
+
+def _type_mask(column: np.ndarray, enforced_type: type, value_types: list = None) -> np.ndarray:
+    if value_types is not None:
+        # the same test as member_enforcer on every instance, once per distinct type
+        passing = {value_type: issubclass(value_type, enforced_type) for value_type in set(value_types)}
+        return np.fromiter((passing[value_type] for value_type in value_types), dtype=bool, count=len(value_types))
+    kinds = _NUMPY_KINDS.get(enforced_type)
+    if kinds is not None and column.dtype != object:
+        matches = any(np.issubdtype(column.dtype, kind) for kind in kinds)
+        return np.full(len(column), matches, dtype=bool)
+    return np.fromiter((issubclass(type(x), enforced_type) for x in column), dtype=bool, count=len(column))
+
+
+def _compare_one(value, comparison_value, operator_used) -> bool:
+    try:
+        return bool(operator_used(value, comparison_value))
+    except TypeError:
+        return False
+
+
+def _compare(column: np.ndarray, comparison_value, operator_used) -> np.ndarray:
+    ufunc = _UFUNCS.get(operator_used)
+    if ufunc is not None:
+        try:
+            return np.asarray(ufunc(column, comparison_value), dtype=bool)
+        except TypeError:
+            # mixed object column, values that do not support the comparison fail it
+            pass
+    return np.fromiter((_compare_one(x, comparison_value, operator_used) for x in column),
+                       dtype=bool, count=len(column))
+
+
+def member_enforcer_mask(instances_or_array,
+                         enforced_key: str,
+                         enforced_type: type,
+                         comparison_value=None,
+                         operator_used=operator.eq) -> np.ndarray:
+    """
+    The vectorized counterpart of utils.member_enforcer, giving the same outcome for every instance. The values of a
+    ready array have no python type of their own, for a typed array the types map onto the numpy dtype hierarchy
+    (e.g. float onto np.floating, int onto np.integer and np.bool_) and the comparison is done by a single ufunc for the operators of the operator
+    module (e.g. operator.gt onto np.greater).
+
+    :param instances_or_array: a sequence of instances or a numpy array of the attribute values
+    :return: a boolean mask, True where the attribute is present, of the correct type and passes the comparison
+    """
+    present, column, value_types = _present_values(instances_or_array, enforced_key)
+    outcome = _type_mask(column, enforced_type, value_types)
+    if comparison_value is not None and operator_used is not None and outcome.any():
+        outcome[outcome] = _compare(column[outcome], comparison_value, operator_used)
+    mask = np.zeros(len(present), dtype=bool)
+    mask[present] = outcome
+    return mask
+
+
+def member_enforcer_array(enforced_key: str,
+                          enforced_type: type,
+                          comparison_value=None,
+                          operator_used=operator.eq):
+    """
+    Same as utils.member_enforcer, with member_enforcer_mask attached as its batched version
+    """
+    return batched_predicate(member_enforcer(enforced_key, enforced_type, comparison_value, operator_used),
+                             partial(member_enforcer_mask,
+                                     enforced_key=enforced_key,
+                                     enforced_type=enforced_type,
+                                     comparison_value=comparison_value,
+                                     operator_used=operator_used))
+
+
+def key_type_enforcer_array(enforced_type: type, enforced_key: str):
+    """
+    Same as partial(predicates.key_type_enforcer, ...), with a batched version checking the dtype of the column
+    """
+    return batched_predicate(partial(key_type_enforcer, enforced_type=enforced_type, enforced_key=enforced_key),
+                             partial(member_enforcer_mask, enforced_key=enforced_key, enforced_type=enforced_type))
+
+
+def min_value_mask(instances_or_array, enforced_key: str, hard_floor) -> np.ndarray:
+    present, column, _ = _present_values(instances_or_array, enforced_key)
+    mask = np.zeros(len(present), dtype=bool)
+    mask[present] = _compare(column, hard_floor, operator.gt)
+    return mask
+
+
+def min_value_array(enforced_key: str, hard_floor):
+    """
+    Same as partial(predicates.min_value, ...), with a batched version applying np.greater on the column
+    """
+    return batched_predicate(partial(min_value, enforced_key=enforced_key, hard_floor=hard_floor),
+                             partial(min_value_mask, enforced_key=enforced_key, hard_floor=hard_floor))
@@ -0,0 +1,105 @@
+import math
+import pytest
+import operator
+import pickle
+from collections import Counter
+from decorules.has_rules_actions import HasRulesActions
+from decorules.decorators import raise_if_false_on_instance, run_instance_rules, run_changed_instance_rules
+from decorules.predicates import min_list_type_counter
+from decorules.aggregates import TrackedList, aggregate_enforcer
+from functools import partial
+
+
+def test_tracked_list_keeps_aggregates():
+    values = TrackedList([5, 3, 8])
+    assert (values.size, values.sum, values.min, values.max) == (3, 16, 3, 8)
+    assert values.count(3) == 1  # still a list
+    values.append(1)
+    values.pop(0)
+    values.remove(8)
+    assert values == [3, 1]
+    assert (values.sum, values.min, values.max, values.mean) == (4, 1, 3, 2.0)
+    values[0] = 10
+    values[1:] = [4, 4]
+    del values[-1]
+    values += [2]
+    assert values == [10, 4, 2]
+    assert (values.sum, values.min, values.max) == (16, 2, 10)
+    values.insert(0, 'a')
+    assert values.type_counter == Counter({int: 3, str: 1})
+    with pytest.raises(TypeError):
+        values.sum
+    values.clear()
+    assert values.mean is None and values.type_counter == Counter()
+    assert pickle.loads(pickle.dumps(TrackedList([1, 2]))).sum == 3
+
+
+def test_tracked_sums_do_not_drift():
+    values = TrackedList([0.1] * 10)
+    for _ in range(9):
+        values.pop()
+    assert values.sum == 0.1
+    values.extend([1, 1e16, 1.0, -1e16, float('inf')])
+    assert values.sum == float('inf')
+    values.remove(float('inf'))
+    assert values.sum == 2.1 == math.fsum(values)
+    assert aggregate_enforcer('values', 'sum', 2.1, operator.eq)(type('Holder', (), {'values': list(values)}))
+
+
+def test_aggregate_enforcer_on_tracked_and_plain_lists():
+    mean_lt_30 = aggregate_enforcer('to_process_list', 'mean', 30.0)
+    assert mean_lt_30.reads == ('to_process_list',)
+
+    class Holder:
+        def __init__(self, values):
+            self.to_process_list = values
+
+    for list_type in (list, TrackedList):
+        assert mean_lt_30(Holder(list_type()))
+        assert mean_lt_30(Holder(list_type([20, 30])))
+        assert not mean_lt_30(Holder(list_type([30, 40])))
+    with pytest.raises(ValueError):
+        aggregate_enforcer('to_process_list', 'median', 30.0)
+
+
+def test_aggregate_enforcer_counts_and_sums_empty_collections():
+    not_empty = aggregate_enforcer('to_process_list', 'count', 0, operator.gt)
+    sum_at_least_5 = aggregate_enforcer('to_process_list', 'sum', 5, operator.ge)
+    max_below_5 = aggregate_enforcer('to_process_list', 'max', 5, when_empty=False)
+    holder = type('Holder', (), {})()
+    for list_type in (list, TrackedList):
+        holder.to_process_list = list_type()
+        assert not not_empty(holder)
+        assert not sum_at_least_5(holder)
+        assert not max_below_5(holder)
+        holder.to_process_list = list_type([2, 3])
+        assert not_empty(holder) and sum_at_least_5(holder) and max_below_5(holder)
+
+
+def test_aggregate_rules_on_guarded_methods():
+    @raise_if_false_on_instance(partial(min_list_type_counter, list_name='values', min_counter=Counter({int: 1})),
+                                AttributeError)
+    @raise_if_false_on_instance(aggregate_enforcer('values', 'max', 50, operator.lt), ValueError)
+    @raise_if_false_on_instance(aggregate_enforcer('values', 'mean', 30.0), ValueError)
+    class TrackedNumberProcessor(metaclass=HasRulesActions):
+        def __init__(self):
+            self.values = TrackedList([1])
+
+        @run_changed_instance_rules('values')
+        def append_number(self, value):
+            self.values.append(value)
+
+        @run_instance_rules
+        def process_front_number(self):
+            return self.values.pop(0)
+
+    processor = TrackedNumberProcessor()
+    processor.append_number(40)
+    with pytest.raises(ValueError):
+        processor.append_number(60)
+    processor.values.pop()
+    processor.append_number(10)
+    assert processor.process_front_number() == 1
+    assert processor.process_front_number() == 40
+    with pytest.raises(AttributeError):
+        processor.process_front_number()  # no int left
@@ -0,0 +1,168 @@
+import asyncio
+import pytest
+from unittest.mock import Mock
+from decorules.has_rules_actions import HasRulesActions, EnforcedFunctions
+from decorules.decorators import (raise_if_false_on_class,
+                                  raise_if_false_on_instance,
+                                  run_if_false_on_instance,
+                                  run_instance_rules,
+                                  run_instance_actions,
+                                  run_changed_instance_rules)
+
+
+def test_coroutine_methods_run_rules_after_the_body():
+    async def is_below_limit(instance):
+        await asyncio.sleep(0)
+        return instance.total < 100
+
+    @raise_if_false_on_instance(is_below_limit, ValueError)
+    @raise_if_false_on_instance(lambda x: x.total >= 0, ValueError)
+    class AsyncAccount(metaclass=HasRulesActions):
+        def __init__(self):
+            self.total = 0
+
+        @run_instance_rules
+        async def deposit(self, amount):
+            await asyncio.sleep(0)
+            self.total += amount
+            return self.total
+
+    assert asyncio.iscoroutinefunction(AsyncAccount.deposit)
+    plan = EnforcedFunctions.get_instance_plan(AsyncAccount)
+    assert (len(plan.rules), len(plan.async_rules)) == (1, 1)
+
+    async def scenario():
+        account = await EnforcedFunctions.acreate(AsyncAccount)
+        assert await account.deposit(50) == 50
+        with pytest.raises(ValueError):
+            await account.deposit(60)
+        with pytest.raises(ValueError):
+            await account.deposit(-200)
+
+    asyncio.run(scenario())
+
+
+def test_async_actions_run_concurrently():
+    events = []
+
+    async def publish(instance):
+        events.append('publish started')
+        await asyncio.sleep(0.01)
+        events.append('publish done')
+
+    async def audit(instance):
+        events.append('audit started')
+        await asyncio.sleep(0.01)
+        events.append('audit done')
+
+    @run_if_false_on_instance(lambda x: x.count < 2, audit)
+    @run_if_false_on_instance(lambda x: x.count < 2, publish)
+    @run_if_false_on_instance(lambda x: x.count < 1, lambda x: events.append('sync action'))
+    class AuditedCounter(metaclass=HasRulesActions):
+        def __init__(self):
+            self.count = 0
+
+        @run_instance_actions
+        async def increment(self):
+            self.count += 1
+
+    async def scenario():
+        counter = await EnforcedFunctions.acreate(AuditedCounter)
+        await counter.increment()
+        assert events == ['sync action']
+        await counter.increment()
+
+    asyncio.run(scenario())
+    assert events == ['sync action', 'sync action', 'publish started', 'audit started', 'publish done', 'audit done']
+
+
+def test_async_checks_are_rejected_where_they_cannot_be_awaited():
+    async def has_multiplier(cls, attrs=None):
+        return True
+
+    with pytest.raises(TypeError):
+        @raise_if_false_on_class(has_multiplier, AttributeError)
+        class AsyncClassCheck(metaclass=HasRulesActions):
+            pass
+
+    with pytest.raises(TypeError):
+        class AsyncChangedRules(metaclass=HasRulesActions):
+            @run_changed_instance_rules
+            async def update(self):
+                pass
+
+
+def test_async_rules_are_not_skipped_by_sync_paths():
+    async def is_below_limit(instance):
+        return instance.total < 100
+
+    with pytest.raises(TypeError, match='cannot await the async rules'):
+        @raise_if_false_on_instance(is_below_limit, ValueError)
+        class SyncGuardedAccount(metaclass=HasRulesActions):
+            def __init__(self, total=0):
+                self.total = total
+
+            @run_instance_rules
+            def deposit(self, amount):
+                self.total += amount
+
+    @raise_if_false_on_instance(is_below_limit, ValueError)
+    class AsyncLimitedAccount(metaclass=HasRulesActions):
+        def __init__(self, total=0):
+            self.total = total
+
+        @run_instance_actions
+        def log(self):
+            pass  # no async actions to skip
+
+    with pytest.raises(TypeError):
+        class DerivedAccount(AsyncLimitedAccount):
+            @run_instance_rules
+            def deposit(self, amount):
+                self.total += amount
+
+    # instantiation cannot await the async rule either, acreate does
+    with pytest.raises(TypeError, match='acreate'):
+        AsyncLimitedAccount(500)
+    with pytest.raises(ValueError):
+        asyncio.run(EnforcedFunctions.acreate(AsyncLimitedAccount, 500))
+
+    async def load(totals):
+        accounts = [await EnforcedFunctions.acreate(AsyncLimitedAccount) for _ in totals]
+        for account, total in zip(accounts, totals):
+            account.total = total  # bypasses the rules, as a loader would
+        return accounts
+
+    accounts = asyncio.run(load((10, 500, 20, 1000)))
+    assert EnforcedFunctions.validate_many(accounts).failed_indices == [1, 3]
+
+    async def in_a_loop():
+        with pytest.raises(TypeError):
+            EnforcedFunctions.validate_many(accounts)
+
+    asyncio.run(in_a_loop())
+
+
+def test_async_rules_added_to_a_base_check_the_guarded_methods_of_derived_classes():
+    async def is_positive(instance):
+        return instance.v > 0
+
+    class Base(metaclass=HasRulesActions):
+        def __init__(self, v=1):
+            self.v = v
+
+    class Derived(Base):
+        @run_instance_rules
+        def setv(self, v):
+            self.v = v
+
+    with pytest.raises(TypeError, match='Derived.setv'):
+        raise_if_false_on_instance(is_positive, ValueError)(Base)
+
+
+def test_any_class_attribute_can_be_defined():
+    # a mock answers every attribute, it is not taken for a guarded method
+    class WithClient(metaclass=HasRulesActions):
+        client = Mock()
+
+    assert isinstance(WithClient().client, Mock)
@@ -0,0 +1,139 @@
+import importlib
+import sys
+import threading
+import pytest
+from decorules.has_rules_actions import HasRulesActions, EnforcedFunctions
+from decorules.decorators import raise_if_false_on_class
+from decorules.cache import ClassCheckCache
+
+
+def has_positive_rate(cls, attrs: dict = None):
+    return cls.RATE > 0
+
+
+def define_class(rate):
+    @raise_if_false_on_class(has_positive_rate, AttributeError)
+    class CachedClass(metaclass=HasRulesActions):
+        RATE = rate
+
+    return CachedClass
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ClassCheckCache(str(tmp_path / 'checks.sqlite'))
+    EnforcedFunctions.use_class_check_cache(cache)
+    yield cache
+    EnforcedFunctions.use_class_check_cache(None)
+    cache.close()
+
+
+def test_passing_class_checks_are_not_run_again(cache):
+    define_class(1.5)
+    assert (cache.hits, cache.misses) == (0, 1)
+    defined = define_class(1.5)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert EnforcedFunctions.class_check_report()[defined]['cached'] == 1
+
+    # a different value is a different class as far as the cache is concerned
+    define_class(2.5)
+    assert (cache.hits, cache.misses) == (1, 2)
+    for _ in range(2):
+        with pytest.raises(AttributeError):
+            define_class(-1.0)
+    assert (cache.hits, cache.misses) == (1, 4)
+
+    # another process (here another cache object) finds the entries on disk
+    cache.close()
+    reopened = ClassCheckCache(cache.path)
+    EnforcedFunctions.use_class_check_cache(reopened)
+    define_class(2.5)
+    assert (reopened.hits, reopened.misses) == (1, 0)
+    reopened.clear()
+    define_class(2.5)
+    assert (reopened.hits, reopened.misses) == (1, 1)
+
+
+def test_unusable_cache_runs_the_checks(tmp_path):
+    (tmp_path / 'not_a_directory').write_text('')
+    cache = ClassCheckCache(str(tmp_path / 'not_a_directory' / 'checks.sqlite'))
+    EnforcedFunctions.use_class_check_cache(cache)
+    try:
+        define_class(1.5)
+        define_class(1.5)
+        assert (cache.hits, cache.misses) == (0, 2)
+    finally:
+        EnforcedFunctions.use_class_check_cache(None)
+
+
+ALLOWED = {'EUR', 'USD'}
+
+
+def has_allowed_currencies(cls, attrs: dict = None):
+    return set(cls.CURRENCIES) <= ALLOWED
+
+
+def define_currencies(currencies, **attributes):
+    @raise_if_false_on_class(has_allowed_currencies, AttributeError)
+    class Currencies(metaclass=HasRulesActions):
+        CURRENCIES = tuple(currencies)  # e.g. read from the environment
+        locals().update(attributes)
+
+    return Currencies
+
+
+def test_fingerprints_cover_values_and_the_module_level_values_of_rules(cache):
+    define_currencies(['EUR'])
+    define_currencies(['EUR'])
+    assert (cache.hits, cache.misses) == (1, 1)
+    with pytest.raises(AttributeError):
+        define_currencies(['EUR', 'GBP'])
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    # a module level set the rule refers to changes its fingerprint as well
+    ALLOWED.discard('EUR')
+    try:
+        with pytest.raises(AttributeError):
+            define_currencies(['EUR'])
+    finally:
+        ALLOWED.add('EUR')
+    define_currencies(['EUR'])
+    assert (cache.hits, cache.misses) == (2, 3)
+
+    # a value without a fingerprint keeps the class out of the cache
+    for _ in range(2):
+        define_currencies(['EUR'], LOCK=threading.Lock())
+    assert (cache.hits, cache.misses) == (2, 5)
+
+
+def test_fingerprints_cover_the_modules_rules_read_from(cache, tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    (tmp_path / 'cached_rate_rules.py').write_text(
+        "import cached_rate_settings\n\n\n"
+        "def rate_below_max(cls, attrs=None):\n"
+        "    return cls.RATE < cached_rate_settings.MAX_RATE\n")
+
+    def define_in_new_process(max_rate):
+        # a later run: the settings module changed, the modules are imported again and so is the cache
+        (tmp_path / 'cached_rate_settings.py').write_text(f"MAX_RATE = {max_rate}\n")
+        for name in ('cached_rate_rules', 'cached_rate_settings'):
+            sys.modules.pop(name, None)
+        importlib.invalidate_caches()
+        rules = importlib.import_module('cached_rate_rules')
+        process_cache = ClassCheckCache(cache.path)
+        EnforcedFunctions.use_class_check_cache(process_cache)
+
+        @raise_if_false_on_class(rules.rate_below_max, AttributeError)
+        class RatedClass(metaclass=HasRulesActions):
+            RATE = 5
+
+        return process_cache
+
+    try:
+        assert define_in_new_process(10).misses == 1
+        assert define_in_new_process(10).hits == 1
+        with pytest.raises(AttributeError):
+            define_in_new_process(1)
+    finally:
+        for name in ('cached_rate_rules', 'cached_rate_settings'):
+            sys.modules.pop(name, None)
@@ -2,18 +2,26 @@ import pytest
 import types
 import sys
 import operator
+import gc
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from functools import partial
 from collections import Counter
 from dataclasses import dataclass, field
-from decorules.has_rules_actions import HasRulesActions
+from decorules.has_rules_actions import HasRulesActions, EnforcedFunctions, DeferredRulesError
 from decorules.decorators import (raise_if_false_on_class,
                                   raise_if_false_on_instance,
                                   run_if_false_on_instance,
                                   run_instance_rules,
-                                  run_instance_actions
+                                  run_instance_actions,
+                                  run_instance_rules_and_actions,
+                                  compile_member_enforcers,
+                                  run_changed_instance_rules
                                   )
 from decorules.predicates import key_type_enforcer, min_value, min_list_type_counter
-from decorules.utils import member_enforcer
+from decorules.utils import member_enforcer, Purpose, batched_predicate
+from decorules.policies import EveryNth, Sampled, TimeBudget
 
 
 def test_class_type_wrong_fails_1():
@@ -378,3 +386,700 @@ def test_instance_runs_and_raises_ok_1():
 
 
 
+
+
+def test_instance_plan_cached_and_rebuilt_on_registration():
+    class PlanBaseClass(metaclass=HasRulesActions):
+        def __init__(self, value=5):
+            self.y = value
+
+    class PlanDerivedClass(PlanBaseClass):
+        pass
+
+    PlanDerivedClass()
+    plan = EnforcedFunctions.get_instance_plan(PlanDerivedClass)
+    assert plan.rules == () and plan.actions == ()
+    PlanDerivedClass()
+    assert EnforcedFunctions.get_instance_plan(PlanDerivedClass) is plan
+
+    raise_if_false_on_instance(lambda x: x.y < 10, ValueError)(PlanBaseClass)
+    rebuilt_plan = EnforcedFunctions.get_instance_plan(PlanDerivedClass)
+    assert rebuilt_plan is not plan
+    assert len(rebuilt_plan.rules) == 1
+    with pytest.raises(ValueError):
+        PlanDerivedClass(20)
+
+
+def test_registry_keeps_purposes_apart_in_registration_order():
+    calls = []
+
+    @run_if_false_on_instance(lambda x: calls.append('action') or False, lambda x: None)
+    @raise_if_false_on_instance(lambda x: calls.append('second') or True)
+    @raise_if_false_on_instance(lambda x: calls.append('first') or True)
+    class OrderedRulesClass(metaclass=HasRulesActions):
+        pass
+
+    OrderedRulesClass()
+    assert calls == ['first', 'second', 'action']
+    registry = EnforcedFunctions.get_functions_applied_instance(OrderedRulesClass)
+    assert len(registry.functions(Purpose.RULE)) == 2
+    assert len(registry.functions(Purpose.ACTION)) == 1
+    assert [purpose for _, purpose in registry] == [Purpose.RULE, Purpose.RULE, Purpose.ACTION]
+
+
+def test_registry_keyed_by_class_not_name():
+    def make_class(limit):
+        @raise_if_false_on_instance(lambda x: x.y < limit, ValueError)
+        class SameNameClass(metaclass=HasRulesActions):
+            def __init__(self, value=0):
+                self.y = value
+
+        return SameNameClass
+
+    strict_class = make_class(5)
+    loose_class = make_class(50)
+    loose_class(20)
+    with pytest.raises(ValueError):
+        strict_class(20)
+    assert len(EnforcedFunctions.get_functions_applied_instance(strict_class)) == 1
+    # a name stands for all classes of that name
+    assert len(EnforcedFunctions.get_functions_applied_instance('SameNameClass')) == 2
+    assert len(EnforcedFunctions.get_functions_applied_class('SameNameClass')) == 0
+
+
+def test_registry_entries_released_with_class():
+    @raise_if_false_on_instance(lambda x: True)
+    @raise_if_false_on_class(member_enforcer('static_member', int), AttributeError)
+    class ShortLivedClass(metaclass=HasRulesActions):
+        static_member = 1
+
+    ShortLivedClass()
+    class_ref = weakref.ref(ShortLivedClass)
+    del ShortLivedClass
+    gc.collect()
+    assert class_ref() is None
+    assert 'ShortLivedClass' not in [x.__name__ for x in EnforcedFunctions._functions_applied_to_instance.keys()]
+    assert 'ShortLivedClass' not in [x.__name__ for x in EnforcedFunctions._functions_applied_to_class.keys()]
+
+
+def test_class_rules_only_has_empty_instance_plan():
+    @raise_if_false_on_class(member_enforcer('static_member', int), AttributeError)
+    class ClassRulesOnlyClass(metaclass=HasRulesActions):
+        static_member = 1
+
+    ClassRulesOnlyClass()
+    assert EnforcedFunctions.get_instance_plan(ClassRulesOnlyClass).is_empty
+
+
+def test_instance_rules_and_actions_combined_1():
+    storage_list = []
+
+    @run_if_false_on_instance(lambda x: x.m < 10, lambda x: storage_list.append(x.m))
+    @raise_if_false_on_instance(lambda x: x.m < 100, ValueError)
+    class CombinedPassClass(metaclass=HasRulesActions):
+        def __init__(self, value: int = 0):
+            self.m = value
+
+        @run_instance_rules_and_actions
+        def add(self, other: int):
+            self.m += other
+            return self.m
+
+    a = CombinedPassClass()
+    assert a.add(5) == 5
+    assert storage_list == []
+    assert a.add(10) == 15
+    assert storage_list == [15]
+    with pytest.raises(ValueError):
+        a.add(100)
+    # the rule failed first so the action did not run
+    assert storage_list == [15]
+
+
+def test_validate_many_reports_all_failures():
+    @raise_if_false_on_instance(member_enforcer('y', int, 0, operator.ge), AttributeError)
+    @raise_if_false_on_instance(lambda x: x.y < 10, ValueError)
+    class BatchValidatedClass(metaclass=HasRulesActions):
+        def __init__(self, value=0):
+            self.y = value
+
+    records = [BatchValidatedClass(x) for x in range(5)]
+    for record, value in zip(records, [1, 20, 3, -4, 30]):
+        record.y = value  # bypasses the rules, as a loader would
+    report = EnforcedFunctions.validate_many(records)
+    assert report.count == 5
+    assert not report.passed
+    assert report.failed_indices == [1, 3, 4]
+    assert sorted(len(indices) for indices in report.by_rule().values()) == [1, 2]
+    assert EnforcedFunctions.validate_many(records[:1]).passed
+
+
+def test_validate_many_uses_batched_predicate():
+    batch_sizes = []
+
+    def y_lt_10_batch(instances):
+        batch_sizes.append(len(instances))
+        return [x.y < 10 for x in instances]
+
+    @raise_if_false_on_instance(batched_predicate(lambda x: x.y < 10, y_lt_10_batch), ValueError)
+    class BatchPredicateClass(metaclass=HasRulesActions):
+        def __init__(self, value=0):
+            self.y = value
+
+    records = [BatchPredicateClass(x) for x in range(10)]
+    records[4].y = 15
+    report = EnforcedFunctions.validate_many(iter(records))
+    assert batch_sizes == [10]
+    assert report.failed_indices == [4]
+    with pytest.raises(ValueError):
+        BatchPredicateClass(15)
+
+
+def test_validate_many_with_failing_batched_predicates():
+    def raising_batch(instances):
+        raise RuntimeError("unavailable")
+
+    @raise_if_false_on_instance(batched_predicate(lambda x: x.y < 10, raising_batch), ValueError)
+    class RaisingBatchClass(metaclass=HasRulesActions):
+        def __init__(self, value=0):
+            self.y = value
+
+    @raise_if_false_on_instance(batched_predicate(lambda x: x.y < 10, lambda instances: [True]), ValueError)
+    class ShortBatchClass(metaclass=HasRulesActions):
+        def __init__(self, value=0):
+            self.y = value
+
+    assert EnforcedFunctions.validate_many([RaisingBatchClass(1), RaisingBatchClass(2)]).failed_indices == [0, 1]
+    with pytest.raises(ValueError, match='1 outcomes for 2 instances'):
+        EnforcedFunctions.validate_many([ShortBatchClass(1), ShortBatchClass(2)])
+
+
+def is_q_prime(instance):
+    # deliberately expensive
+    return instance.q > 1 and all(instance.q % divisor for divisor in range(2, instance.q))
+
+
+@raise_if_false_on_instance(member_enforcer('q', int), TypeError)
+@raise_if_false_on_instance(is_q_prime, ValueError)
+class PrimeHolder(metaclass=HasRulesActions):
+    def __init__(self, value=2):
+        self.q = value
+
+
+@pytest.mark.parametrize('executor_type', [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_validate_many_on_an_executor(executor_type):
+    records = [PrimeHolder() for _ in range(50)]
+    for record, value in zip(records, range(50)):
+        record.q = value
+    records[7].q = 'seven'
+    expected = EnforcedFunctions.validate_many(records)
+    with executor_type(max_workers=2) as executor:
+        report = EnforcedFunctions.validate_many(records, executor=executor, chunk_size=8)
+    assert report == expected
+    assert report.count == 50
+    assert report.by_rule()['test_decs.is_q_prime'] == [index for index in range(50)
+                                                         if index == 7 or not is_q_prime(records[index])]
+    assert len(report.by_rule()) == 2
+
+
+def test_compiled_member_enforcers_keep_exceptions_and_messages():
+    def make_class(compiled):
+        @raise_if_false_on_instance(member_enforcer('m', float, 10.0, operator.lt), ValueError, "m must be <10")
+        @raise_if_false_on_instance(member_enforcer('m', float, 0.0, operator.gt), ValueError, "m must be >0")
+        @raise_if_false_on_instance(member_enforcer('n', int), AttributeError, "n must be an int")
+        class MemberRulesClass(metaclass=HasRulesActions):
+            def __init__(self, m=1.0, n=1):
+                self.m = m
+                self.n = n
+
+            @run_instance_rules
+            def set_m(self, value):
+                self.m = value
+
+        return compile_member_enforcers(MemberRulesClass) if compiled else MemberRulesClass
+
+    plain_class, compiled_class = make_class(False), make_class(True)
+    assert len(EnforcedFunctions.get_instance_plan(plain_class).rules) == 3
+    assert len(EnforcedFunctions.get_instance_plan(compiled_class).rules) == 1
+    for arguments, exception_type in [((1.0, 1.0), AttributeError), ((20.0, 1), ValueError),
+                                      ((-2.0, 1), ValueError), ((1, 1), ValueError)]:
+        with pytest.raises(exception_type) as plain_info:
+            plain_class(*arguments)
+        with pytest.raises(exception_type) as compiled_info:
+            compiled_class(*arguments)
+        assert str(plain_info.value) == str(compiled_info.value)
+    instance = compiled_class(5.0, 2)
+    instance.set_m(9.0)
+    with pytest.raises(ValueError, match="m must be <10"):
+        instance.set_m(11.0)
+    instance.m = 12.0
+    assert EnforcedFunctions.validate_many([instance, compiled_class()]).failed_indices == [0]
+
+
+def test_profiling_records_rules_and_actions():
+    storage_list = []
+
+    @run_if_false_on_instance(lambda x: x.m < 10, lambda x: storage_list.append(x.m))
+    @raise_if_false_on_instance(lambda x: x.m < 100, ValueError)
+    class ProfiledClass(metaclass=HasRulesActions):
+        def __init__(self, value: int = 0):
+            self.m = value
+
+    ProfiledClass(1)
+    assert ProfiledClass not in EnforcedFunctions.profiling_snapshot()
+    EnforcedFunctions.enable_profiling()
+    try:
+        ProfiledClass(1)
+        ProfiledClass(20)
+        with pytest.raises(ValueError):
+            ProfiledClass(200)
+        stats = EnforcedFunctions.profiling_snapshot()[ProfiledClass]
+    finally:
+        EnforcedFunctions.disable_profiling()
+        EnforcedFunctions.reset_profiling()
+    assert len(stats) == 2
+    rule_stats, action_stats = stats.values()
+    assert (rule_stats['calls'], rule_stats['failures']) == (3, 1)
+    assert (action_stats['calls'], action_stats['failures']) == (2, 1)
+    assert rule_stats['max_time'] <= rule_stats['total_time']
+    assert not any(hasattr(func, 'plan_wrapped') for func in
+                   EnforcedFunctions.get_instance_plan(ProfiledClass).rules_and_actions)
+
+
+def test_changed_instance_rules_only_run_affected_rules():
+    calls = []
+
+    def x_lt_10(instance):
+        calls.append('x')
+        return instance.x < 10
+
+    def total_lt_100(instance):
+        calls.append('values')
+        return sum(instance.values) < 100
+
+    @raise_if_false_on_instance(member_enforcer('y', int, 0, operator.ge), ValueError)
+    @raise_if_false_on_instance(total_lt_100, ValueError, reads=('values',))
+    @raise_if_false_on_instance(x_lt_10, ValueError, reads=('x',))
+    class WideClass(metaclass=HasRulesActions):
+        def __init__(self):
+            self.x = 0
+            self.y = 0
+            self.values = []
+
+        @run_changed_instance_rules
+        def set_x(self, value):
+            self.x = value
+
+        @run_changed_instance_rules('values')
+        def add_value(self, value):
+            self.values.append(value)
+
+        @run_changed_instance_rules
+        def set_y(self, value):
+            self.y = value
+
+    a = WideClass()
+    calls.clear()
+    a.set_x(5)
+    assert calls == ['x']
+    a.add_value(50)
+    assert calls == ['x', 'values']
+    a.set_y(3)
+    assert calls == ['x', 'values']
+    with pytest.raises(ValueError):
+        a.set_y(-1)
+    with pytest.raises(ValueError):
+        a.add_value(60)
+    with pytest.raises(ValueError):
+        a.set_x(20)
+    a.x = 30  # not guarded, changes outside of guarded methods are not recorded
+    assert '__setattr__' not in vars(WideClass)
+    with EnforcedFunctions.tracking_changes(a, {'values'}) as changed:
+        a.x = 1
+        a.y = a.y
+        del a.values
+    assert changed == {'x', 'values'}
+
+
+def test_deferred_checks_run_once_on_exit():
+    calls = []
+    storage_list = []
+
+    def y_lt_10(instance):
+        calls.append(instance.y)
+        return instance.y < 10
+
+    @run_if_false_on_instance(lambda x: x.y < 5, lambda x: storage_list.append(x.y))
+    @raise_if_false_on_instance(y_lt_10, ValueError)
+    class DeferredClass(metaclass=HasRulesActions):
+        def __init__(self, value=0):
+            self.y = value
+
+        @run_instance_rules_and_actions
+        def add(self, value=1):
+            self.y += value
+
+    a, b = DeferredClass(), DeferredClass()
+    calls.clear()
+    with EnforcedFunctions.deferred(a):
+        for _ in range(20):
+            a.add(1)
+        a.add(-14)
+        b.add(1)
+        assert calls == [1]  # b is not deferred
+    assert calls == [1, 6]
+    assert storage_list == [6]
+
+    with pytest.raises(DeferredRulesError) as error_info:
+        with EnforcedFunctions.deferred():
+            a.add(10)
+            b.add(20)
+            b.add(1)
+    assert [instance for instance, _ in error_info.value.failures] == [a, b]
+    assert all(isinstance(ex, ValueError) for _, ex in error_info.value.failures)
+    assert storage_list == [6]
+
+    with pytest.raises(KeyError):
+        with EnforcedFunctions.deferred():
+            a.add(1)
+            raise KeyError('dropped')
+    with pytest.raises(ValueError):
+        a.add(1)
+
+
+def test_enforcement_policies_skip_checks():
+    calls = []
+
+    def z_lt_10(instance):
+        calls.append('z')
+        return instance.z < 10
+
+    def z_ge_0(instance):
+        calls.append('ge')
+        return instance.z >= 0
+
+    @raise_if_false_on_instance(z_ge_0, ValueError)
+    @raise_if_false_on_instance(z_lt_10, ValueError, policy=EveryNth(3))
+    class SampledClass(metaclass=HasRulesActions):
+        def __init__(self, value=0):
+            self.z = value
+
+        @run_instance_rules(policy=EveryNth(2))
+        def set_z(self, value):
+            self.z = value
+
+    for value in range(4):
+        SampledClass(value)
+    assert calls == ['z', 'ge', 'ge', 'ge', 'z', 'ge']
+    SampledClass(50)  # skipped by the policy of z_lt_10
+    SampledClass(50)
+    with pytest.raises(ValueError):
+        SampledClass(50)
+
+    a = SampledClass(1)
+    calls.clear()
+    a.set_z(2)
+    a.set_z(3)
+    assert calls == ['ge']
+
+    # policies can be swapped at runtime, the class policy decides for all rules at once
+    EnforcedFunctions.set_policy(SampledClass, None, z_lt_10)
+    EnforcedFunctions.set_policy(SampledClass, Sampled(0.5, iter([0.7, 0.2]).__next__))
+    calls.clear()
+    SampledClass(1)
+    SampledClass(1)
+    assert calls == ['z', 'ge']  # the first construction skipped both rules
+    EnforcedFunctions.set_policy(SampledClass, None)
+    with pytest.raises(ValueError):
+        SampledClass(50)
+
+
+def test_rules_sharing_an_identity_are_kept_apart():
+    def below(limit):
+        return lambda instance: instance.v < limit
+
+    @raise_if_false_on_instance(below(100), ValueError, policy=Sampled(0.0))
+    @raise_if_false_on_instance(below(5), ValueError)
+    class BoundedClass(metaclass=HasRulesActions):
+        def __init__(self, value=0):
+            self.v = value
+
+    # the policy of below(100) does not switch off below(5)
+    with pytest.raises(ValueError):
+        BoundedClass(50)
+    rule_ids = [func.rule_id for func in EnforcedFunctions.get_instance_plan(BoundedClass).rules]
+    assert len(set(rule_ids)) == 2 and rule_ids[1] == rule_ids[0] + '#2'
+
+    bounded = BoundedClass(1)
+    bounded.v = 50
+    assert list(EnforcedFunctions.validate_many([bounded]).by_rule()) == [rule_ids[0]]
+
+
+def test_skipped_checks_in_profiling():
+    @raise_if_false_on_instance(lambda x: x.w < 10, ValueError)
+    class BudgetClass(metaclass=HasRulesActions):
+        def __init__(self, value=0):
+            self.w = value
+
+    ticks = iter(range(100))
+    # every reading of the clock is 10us later, a check that ran takes 10us
+    budget = TimeBudget(5.0, clock=lambda: next(ticks) * 1e-5)
+    EnforcedFunctions.set_policy(BudgetClass, budget)
+    EnforcedFunctions.enable_profiling()
+    try:
+        with pytest.raises(ValueError):
+            BudgetClass(50)
+        BudgetClass(50)  # no budget left in this second
+        stats = EnforcedFunctions.profiling_snapshot()[BudgetClass]
+    finally:
+        EnforcedFunctions.disable_profiling()
+        EnforcedFunctions.reset_profiling()
+    (rule_stats,) = stats.values()
+    assert (rule_stats['calls'], rule_stats['skipped']) == (1, 1)
+    assert (budget.calls, budget.skipped) == (1, 1)
+
+
+def test_disable_swaps_in_undecorated_methods():
+    @raise_if_false_on_instance(lambda x: x.v < 10, ValueError)
+    class SwitchedClass(metaclass=HasRulesActions):
+        def __init__(self, value=0):
+            self.v = value
+
+        @run_instance_rules
+        def set_v(self, value):
+            self.v = value
+
+        @property
+        def w(self):
+            return self.v
+
+        @w.setter
+        @run_changed_instance_rules
+        def w(self, value):
+            self.v = value
+
+    class DerivedSwitchedClass(SwitchedClass):
+        pass
+
+    guarded_set_v = SwitchedClass.set_v
+    guarded_w_setter = vars(SwitchedClass)['w'].fset
+    EnforcedFunctions.disable(SwitchedClass)
+    try:
+        assert SwitchedClass.set_v is guarded_set_v.__wrapped__
+        assert vars(SwitchedClass)['w'].fset is guarded_w_setter.__wrapped__
+        a = DerivedSwitchedClass(50)
+        a.set_v(60)
+        a.w = 70
+        assert EnforcedFunctions.get_instance_plan(DerivedSwitchedClass).is_empty
+    finally:
+        EnforcedFunctions.enable(SwitchedClass)
+    assert SwitchedClass.set_v is guarded_set_v
+    assert vars(SwitchedClass)['w'].fset is guarded_w_setter
+    with pytest.raises(ValueError):
+        a.set_v(60)
+    with pytest.raises(ValueError):
+        a.w = 70
+    with pytest.raises(ValueError):
+        DerivedSwitchedClass(50)
+
+
+def test_disable_globally_skips_metaclass_but_not_class_checks():
+    @raise_if_false_on_instance(lambda x: x.v < 10, ValueError)
+    class GloballySwitchedClass(metaclass=HasRulesActions):
+        def __init__(self, value=0):
+            self.v = value
+
+    EnforcedFunctions.disable()
+    try:
+        assert HasRulesActions.__call__ is type.__call__
+        GloballySwitchedClass(50)
+
+        class DefinedWhileDisabled(GloballySwitchedClass):
+            @run_instance_rules
+            def set_v(self, value):
+                self.v = value
+
+        DefinedWhileDisabled(50).set_v(60)
+        assert not hasattr(DefinedWhileDisabled.set_v, 'guarded')
+        with pytest.raises(AttributeError):
+            @raise_if_false_on_class(member_enforcer('MULTIPLIER', float), AttributeError)
+            class MissingMultiplierClass(metaclass=HasRulesActions):
+                pass
+    finally:
+        EnforcedFunctions.enable()
+    with pytest.raises(ValueError):
+        GloballySwitchedClass(50)
+    with pytest.raises(ValueError):
+        DefinedWhileDisabled(1).set_v(60)
+
+
+def test_registration_and_instantiation_from_many_threads():
+    class SharedBase(metaclass=HasRulesActions):
+        def __init__(self):
+            self.u = 0
+
+    errors = []
+    snapshot = EnforcedFunctions.get_functions_applied_instance(SharedBase)
+
+    def register(thread_index):
+        try:
+            for rule_index in range(50):
+                raise_if_false_on_instance(lambda x, limit=rule_index: x.u <= limit, ValueError)(SharedBase)
+                type(f'Plugin{thread_index}_{rule_index}', (SharedBase,), {})()
+        except Exception as ex:
+            errors.append(ex)
+
+    def instantiate():
+        try:
+            for _ in range(200):
+                SharedBase()
+                EnforcedFunctions.validate_many([SharedBase()])
+        except Exception as ex:
+            errors.append(ex)
+
+    threads = [threading.Thread(target=register, args=(index,)) for index in range(4)]
+    threads += [threading.Thread(target=instantiate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(snapshot) == 0  # registries are replaced, never changed
+    assert len(EnforcedFunctions.get_functions_applied_instance(SharedBase)) == 200
+    assert len(EnforcedFunctions.get_instance_plan(SharedBase).rules) == 200
+
+
+def test_class_checks_receive_the_namespace_and_hold_for_subclasses():
+    received = []
+
+    def has_positive_rate(cls, attrs: dict = None):
+        received.append(attrs)
+        return key_type_enforcer(cls, float, 'RATE', attrs) and cls.RATE > 0
+
+    @raise_if_false_on_class(member_enforcer('RATE', float, 0.0, operator.gt), AttributeError)
+    @raise_if_false_on_class(has_positive_rate, AttributeError)
+    class RatedClass(metaclass=HasRulesActions):
+        RATE = 0.5
+
+    assert received == [None]
+
+    class UncheckedRatedClass(RatedClass):
+        RATE = -1.0  # the class checks of the bases only run on derived classes when asked to
+
+    assert received == [None]
+    EnforcedFunctions.inherit_class_checks()
+    try:
+        class DerivedRatedClass(RatedClass):
+            RATE = 1.5
+
+        assert received[-1]['RATE'] == 1.5
+        with pytest.raises(AttributeError):
+            class NegativeRatedClass(RatedClass):
+                RATE = -1.0
+    finally:
+        EnforcedFunctions.inherit_class_checks(False)
+
+    # a namespace holding dictionaries does not get in the way
+    check = EnforcedFunctions.get_functions_applied_class(RatedClass).functions()[0]
+    assert check(DerivedRatedClass, {'RATE': 1.5, 'lookup': {'RATE': -1.0}})
+
+
+def test_class_checks_verified_on_first_use():
+    EnforcedFunctions.verify_on_first_use()
+    EnforcedFunctions.inherit_class_checks()
+    try:
+        @raise_if_false_on_class(member_enforcer('LIMIT', int, 0, operator.gt), AttributeError)
+        class LazilyCheckedClass(metaclass=HasRulesActions):
+            LIMIT = -1
+
+        @raise_if_false_on_class(member_enforcer('LIMIT', int, 0, operator.gt), AttributeError)
+        class LazilyCheckedOkClass(metaclass=HasRulesActions):
+            LIMIT = 1
+
+        class LazilyDerivedClass(LazilyCheckedOkClass):
+            LIMIT = -2
+    finally:
+        EnforcedFunctions.verify_on_first_use(False)
+        EnforcedFunctions.inherit_class_checks(False)
+
+    assert LazilyCheckedOkClass not in EnforcedFunctions.class_check_report()
+    LazilyCheckedOkClass()
+    assert EnforcedFunctions.class_check_report()[LazilyCheckedOkClass]['checks'] == 1
+    for _ in range(2):
+        with pytest.raises(AttributeError):
+            LazilyCheckedClass()
+    with pytest.raises(AttributeError):
+        EnforcedFunctions.verify_all()
+    LazilyCheckedClass.LIMIT = 1
+    with pytest.raises(AttributeError):
+        EnforcedFunctions.verify_all()  # the check of the base fails on LazilyDerivedClass
+    LazilyDerivedClass.LIMIT = 2
+    EnforcedFunctions.verify_all()
+    LazilyCheckedClass()
+    assert LazilyCheckedClass not in EnforcedFunctions._pending_class_checks
+    assert LazilyDerivedClass not in EnforcedFunctions._pending_class_checks
+
+
+def test_class_checks_verified_on_first_use_still_run_when_disabled():
+    EnforcedFunctions.verify_on_first_use()
+    try:
+        @raise_if_false_on_class(member_enforcer('LIMIT', int, 0, operator.gt), AttributeError)
+        class PendingClass(metaclass=HasRulesActions):
+            LIMIT = -1
+
+        with pytest.raises(AttributeError):
+            EnforcedFunctions.disable()  # would leave the check pending forever
+        assert not EnforcedFunctions.is_disabled()
+        PendingClass.LIMIT = 1
+        EnforcedFunctions.disable()
+        try:
+            with pytest.raises(AttributeError):
+                @raise_if_false_on_class(member_enforcer('LIMIT', int, 0, operator.gt), AttributeError)
+                class DisabledClass(metaclass=HasRulesActions):
+                    LIMIT = -5
+        finally:
+            EnforcedFunctions.enable()
+    finally:
+        EnforcedFunctions.verify_on_first_use(False)
+    assert not EnforcedFunctions._pending_class_checks
+
+
+def test_slotted_classes_get_no_instance_storage():
+    class PlainSlotted:
+        __slots__ = ('price', 'quantity')
+
+        def __init__(self, price=1.0, quantity=1):
+            self.price = price
+            self.quantity = quantity
+
+    @raise_if_false_on_instance(member_enforcer('quantity', int, 0, operator.gt), ValueError)
+    @raise_if_false_on_instance(member_enforcer('price', float, 0.0, operator.gt), ValueError)
+    class SlottedRecord(metaclass=HasRulesActions):
+        __slots__ = ('price', 'quantity')
+
+        def __init__(self, price=1.0, quantity=1):
+            self.price = price
+            self.quantity = quantity
+
+        @run_changed_instance_rules
+        def set_price(self, price):
+            self.price = price
+
+        @run_instance_rules
+        def clear_quantity(self):
+            del self.quantity
+
+    record = SlottedRecord()
+    record.set_price(2.0)
+    assert not hasattr(record, '__dict__')
+    assert sys.getsizeof(record) == sys.getsizeof(PlainSlotted())
+    (plan_rule,) = EnforcedFunctions.get_instance_plan(SlottedRecord).rules
+    assert plan_rule.compiled_from  # both rules read their slot directly
+    with pytest.raises(ValueError) as error_info:
+        record.set_price(-1.0)
+    assert 'fails instance check' in str(error_info.value)
+    record.price = 1.0
+    with pytest.raises(ValueError):
+        record.clear_quantity()
+    with pytest.raises(ValueError):
+        SlottedRecord(1.0, 0)
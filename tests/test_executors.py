@@ -0,0 +1,91 @@
+import threading
+import time
+import pytest
+from decorules.has_rules_actions import HasRulesActions
+from decorules.decorators import run_if_false_on_instance, run_instance_actions
+from decorules.executors import BoundedQueueExecution, DropPolicy, InlineExecution, ThreadPoolExecution
+
+
+def make_class(action, execution):
+    @run_if_false_on_instance(lambda x: x.n >= 0, action, execution=execution)
+    class ActedOnClass(metaclass=HasRulesActions):
+        def __init__(self, n=0):
+            self.n = n
+
+        @run_instance_actions
+        def set_n(self, n):
+            self.n = n
+
+    return ActedOnClass
+
+
+def test_inline_and_thread_pool_executions():
+    seen = []
+    inline_class = make_class(lambda x: seen.append(x.n), InlineExecution())
+    inline_class(-1)
+    assert seen == [-1]
+
+    with ThreadPoolExecution(max_workers=2) as execution:
+        pooled_class = make_class(lambda x: seen.append(threading.current_thread().name), execution)
+        pooled_class(-2).set_n(-3)
+        pooled_class(5)
+        execution.flush()
+        assert len(seen) == 3
+        assert all(name.startswith('decorules-action') for name in seen[1:])
+
+
+def test_slow_actions_do_not_block_construction():
+    release = threading.Event()
+    done = []
+
+    def slow_action(instance):
+        release.wait()
+        done.append(instance.n)
+
+    execution = BoundedQueueExecution(max_size=10)
+    queued_class = make_class(slow_action, execution)
+    start = time.perf_counter()
+    for n in range(-5, 0):
+        queued_class(n)
+    assert time.perf_counter() - start < 0.5
+    assert done == []
+    release.set()
+    execution.flush(timeout=5)
+    assert done == [-5, -4, -3, -2, -1]
+    execution.shutdown()
+    with pytest.raises(RuntimeError):
+        queued_class(-1)
+
+
+@pytest.mark.parametrize('drop_policy, kept', [(DropPolicy.DROP_NEWEST, [-1, -2, -3]),
+                                               (DropPolicy.DROP_OLDEST, [-1, -4, -5])])
+def test_bounded_queue_drop_policies(drop_policy, kept):
+    started = threading.Event()
+    release = threading.Event()
+    done = []
+
+    def blocking_action(instance):
+        started.set()
+        release.wait()
+        done.append(instance.n)
+
+    execution = BoundedQueueExecution(max_size=2, drop_policy=drop_policy)
+    queued_class = make_class(blocking_action, execution)
+    queued_class(-1)
+    started.wait(5)  # the worker holds -1, the queue has room for two more
+    for n in (-2, -3, -4, -5):
+        queued_class(n)
+    release.set()
+    execution.shutdown()
+    assert done == kept
+    assert execution.dropped == 2
+
+
+def test_failing_actions_are_collected():
+    def failing_action(instance):
+        raise KeyError(instance.n)
+
+    with BoundedQueueExecution() as execution:
+        make_class(failing_action, execution)(-1)
+        execution.flush()
+    assert [type(error) for error in execution.errors] == [KeyError]
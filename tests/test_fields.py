@@ -0,0 +1,112 @@
+import operator
+import pytest
+from decorules.has_rules_actions import HasRulesActions, EnforcedFunctions
+from decorules.decorators import raise_if_false_on_instance, run_changed_instance_rules
+from decorules.utils import member_enforcer
+
+
+@raise_if_false_on_instance(member_enforcer('MULTIPLIER', float, 0.0, operator.gt), ValueError, on_assignment=True)
+class Scaled(metaclass=HasRulesActions):
+    MULTIPLIER = 1.5
+
+    def multiply_multiplier(self, value):
+        self.MULTIPLIER = self.MULTIPLIER * value
+
+
+class Doubled(Scaled):
+    MULTIPLIER = 2.0
+
+
+def test_assignments_are_checked():
+    scaled = Scaled()
+    assert scaled.MULTIPLIER == 1.5 and Scaled.MULTIPLIER == 1.5
+    scaled.multiply_multiplier(2.0)
+    assert scaled.MULTIPLIER == 3.0 and Scaled.MULTIPLIER == 1.5
+    with pytest.raises(ValueError, match='fails instance check'):
+        scaled.multiply_multiplier(-1.0)
+    assert scaled.MULTIPLIER == 3.0
+    with pytest.raises(ValueError):
+        scaled.MULTIPLIER = 'large'
+    del scaled.MULTIPLIER
+    assert scaled.MULTIPLIER == 1.5
+
+
+def test_redefined_fields_stay_checked():
+    doubled = Doubled()
+    assert doubled.MULTIPLIER == 2.0 and Doubled.MULTIPLIER == 2.0
+    with pytest.raises(ValueError):
+        doubled.multiply_multiplier(0.0)
+    with pytest.raises(ValueError):
+        class Negative(Scaled):
+            MULTIPLIER = -1.0
+
+        Negative()  # the default itself is still checked on construction
+
+
+def test_slotted_fields_and_changed_rules():
+    @raise_if_false_on_instance(member_enforcer('quantity', int, 0, operator.gt), ValueError, on_assignment=True)
+    @raise_if_false_on_instance(member_enforcer('price', float, 0.0, operator.gt), ValueError, on_assignment=True)
+    class Order(metaclass=HasRulesActions):
+        __slots__ = ('price', 'quantity')
+
+        def __init__(self, price, quantity):
+            self.price = price
+            self.quantity = quantity
+
+        @run_changed_instance_rules
+        def set_price(self, price):
+            self.price = price
+
+    order = Order(1.5, 2)
+    order.set_price(2.5)
+    assert (order.price, order.quantity) == (2.5, 2)
+    with pytest.raises(ValueError):
+        order.set_price(-2.5)
+    with pytest.raises(ValueError):
+        order.quantity = 0
+    with pytest.raises(ValueError):
+        Order(1.5, 0)
+    assert not hasattr(order, '__dict__')
+
+    EnforcedFunctions.disable(Order)
+    try:
+        order.quantity = 0
+        assert order.quantity == 0
+    finally:
+        EnforcedFunctions.enable(Order)
+    with pytest.raises(ValueError):
+        order.quantity = -1
+
+
+def test_changed_rules_cover_deleted_fields():
+    @raise_if_false_on_instance(member_enforcer('quantity', int, 0, operator.gt), ValueError, on_assignment=True)
+    class Stock(metaclass=HasRulesActions):
+        def __init__(self, quantity):
+            self.quantity = quantity
+
+        @run_changed_instance_rules
+        def drop_quantity(self):
+            del self.quantity
+
+    # a deleted member is not assigned, the rule itself runs again after the change
+    with pytest.raises(ValueError):
+        Stock(2).drop_quantity()
+
+
+def test_only_member_enforcers_on_assignment():
+    with pytest.raises(TypeError):
+        raise_if_false_on_instance(lambda instance: True, ValueError, on_assignment=True)
+
+
+@pytest.mark.parametrize('globally', [False, True])
+def test_fields_redefined_while_disabled_get_their_checks_back(globally):
+    EnforcedFunctions.disable(None if globally else Scaled)
+    try:
+        class Tripled(Scaled):
+            MULTIPLIER = 3.0
+
+        Tripled().MULTIPLIER = -3.0
+    finally:
+        EnforcedFunctions.enable(None if globally else Scaled)
+    with pytest.raises(ValueError):
+        Tripled().MULTIPLIER = -3.0
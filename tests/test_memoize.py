@@ -0,0 +1,92 @@
+import gc
+import weakref
+from dataclasses import dataclass
+import pytest
+from decorules.has_rules_actions import HasRulesActions, EnforcedFunctions
+from decorules.decorators import raise_if_false_on_instance, run_instance_rules
+from decorules.memoize import Memoization
+
+calls = []
+
+
+def is_price_positive(instance):
+    calls.append(instance.price)
+    return instance.price > 0
+
+
+def test_hashable_instances_share_outcomes():
+    memoization = Memoization(maxsize=2)
+
+    @raise_if_false_on_instance(is_price_positive, ValueError, memoize=memoization)
+    @dataclass(frozen=True)
+    class FrozenQuote(metaclass=HasRulesActions):
+        price: float
+
+        @run_instance_rules
+        def describe(self):
+            return f"quote at {self.price}"
+
+    calls.clear()
+    quote = FrozenQuote(1.5)
+    for _ in range(10):
+        quote.describe()
+    FrozenQuote(1.5)
+    assert calls == [1.5]
+    assert (memoization.hits, memoization.misses) == (11, 1)
+    quotes = [FrozenQuote(2.5), FrozenQuote(3.5)]  # evicts 1.5
+    quotes.append(FrozenQuote(1.5))
+    assert calls == [1.5, 2.5, 3.5, 1.5]
+    assert len(memoization) == 2
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            FrozenQuote(-1.0)
+
+    # the entries keep neither the instances nor their class alive
+    quote_class = weakref.ref(FrozenQuote)
+    del quote, quotes, FrozenQuote
+    gc.collect()
+    assert len(memoization) == 0
+    assert quote_class() is None
+
+
+def test_versioned_instances_are_rechecked_on_change_and_forgotten():
+    @raise_if_false_on_instance(is_price_positive, ValueError, memoize=True)
+    class VersionedQuote(metaclass=HasRulesActions):
+        def __init__(self, price):
+            self.price = price
+            self.version = 0
+
+        @run_instance_rules
+        def set_price(self, price):
+            self.price = price
+            self.version += 1
+
+        @run_instance_rules
+        def describe(self):
+            return self.price
+
+    class UnversionedQuote(VersionedQuote):
+        def __init__(self, price):
+            super().__init__(price)
+            self.version = None
+
+    calls.clear()
+    quote = VersionedQuote(1.0)
+    quote.describe()
+    quote.describe()
+    assert calls == [1.0]
+    quote.set_price(2.0)
+    quote.describe()
+    assert calls == [1.0, 2.0]
+    with pytest.raises(ValueError):
+        quote.set_price(-2.0)
+
+    (rule,) = EnforcedFunctions.get_instance_plan(VersionedQuote).rules
+    assert len(rule.memoization) == 3
+    del quote
+    gc.collect()
+    assert len(rule.memoization) == 0
+
+    unversioned = UnversionedQuote(1.0)
+    unversioned.describe()
+    assert calls == [1.0, 2.0, -2.0, 1.0, 1.0]
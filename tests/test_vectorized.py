@@ -0,0 +1,68 @@
+import pytest
+import operator
+from collections.abc import Iterable
+from decorules.has_rules_actions import HasRulesActions, EnforcedFunctions
+from decorules.decorators import raise_if_false_on_instance
+from decorules.utils import member_enforcer
+
+np = pytest.importorskip("numpy")
+
+from decorules.vectorized import member_enforcer_array, member_enforcer_mask, key_type_enforcer_array, \
+    min_value_array, min_value_mask
+
+
+class Record:
+    def __init__(self, value):
+        self.value = value
+
+
+def test_member_enforcer_mask_on_instances():
+    records = [Record(x) for x in [1.5, 0.5, None, 3, 2.5]]
+    mask = member_enforcer_mask(records, 'value', float, 1.0, operator.gt)
+    assert mask.tolist() == [True, False, False, False, True]
+
+
+def test_member_enforcer_mask_on_array():
+    column = np.array([0.5, 1.0, 2.0])
+    assert member_enforcer_mask(column, 'value', float, 1.0, operator.le).tolist() == [True, True, False]
+    assert member_enforcer_mask(column, 'value', int).tolist() == [False, False, False]
+    assert member_enforcer_mask(np.arange(3), 'value', int, 1, operator.ne).tolist() == [True, False, True]
+    assert member_enforcer_mask(np.array([True, False]), 'value', int).tolist() == [True, True]
+
+
+@pytest.mark.parametrize('values', [[True, True], [np.int64(3), np.int64(4)], [np.float64(1.5), 2.5],
+                                    [np.bool_(True), 1], [2, 3]])
+@pytest.mark.parametrize('enforced_type', [int, float, bool])
+def test_member_enforcer_mask_agrees_with_member_enforcer(values, enforced_type):
+    records = [Record(x) for x in values]
+    predicate = member_enforcer('value', enforced_type)
+    assert member_enforcer_mask(records, 'value', enforced_type).tolist() == [predicate(x) for x in records]
+
+
+def test_member_enforcer_mask_on_object_values():
+    records = [Record([1, 2]), Record(5), Record((3,))]
+    assert member_enforcer_mask(records, 'value', Iterable).tolist() == [True, False, True]
+
+
+def test_min_value_mask():
+    records = [Record(x) for x in [10, 2, None, 7]]
+    assert min_value_mask(records, 'value', 5).tolist() == [True, False, False, True]
+
+
+def test_validate_many_with_array_predicates():
+    @raise_if_false_on_instance(min_value_array('value', 0.0), ValueError)
+    @raise_if_false_on_instance(key_type_enforcer_array(float, 'value'), AttributeError)
+    @raise_if_false_on_instance(member_enforcer_array('value', float, 100.0, operator.lt), ValueError)
+    class ArrayCheckedRecord(metaclass=HasRulesActions):
+        def __init__(self, value=1.0):
+            self.value = value
+
+    records = [ArrayCheckedRecord(float(x)) for x in range(1, 6)]
+    records[1].value = -1.0
+    records[3].value = 200.0
+    records[4].value = 'text'
+    report = EnforcedFunctions.validate_many(records)
+    assert report.failed_indices == [1, 3, 4]
+    assert len(report.failures) == 5
+    with pytest.raises(ValueError):
+        ArrayCheckedRecord(150.0)